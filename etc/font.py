@@ -17,7 +17,13 @@
 # - I don't want to write Python reimplementations of C code in FFI hell 
 #   anymore. I've spent 4 hours trying to load the font and I am TIRED!!
 
-from typing import Any
+import os
+import mmap
+import struct
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Callable, Optional
 import pyray as rl
 
 CHARS = "abcdefghijklmnopqrstuvwxyz"
@@ -27,22 +33,226 @@ CHARS += "!@#$%^&*()_+-=`~,.<>;':\"/?[]{}\\|"
 CHARS += "░▒▓🯆█▌"
 CODEPOINTS = tuple(ord(c) for c in CHARS)
 
-def load_jagged_ttf(file_name: str, font_size: int):
-    with open(file_name, "rb") as file:
-        data = file.read()
+class GlyphMetrics:
+    # Advance widths copied out of the font once at load time. Text layout runs
+    # over every character of every line, and going through cffi for each one
+    # (get_glyph_index + glyphs[i].advanceX) was most of our frame time
+
+    # raylib's default textLineSpacing, which measure_text_ex adds between lines
+    LINE_SPACING = 2
+
+    def __init__(self, base_size: int, advances: dict[int, float], fallback: float) -> None:
+        self.base_size = base_size
+        self.advances = advances
+        # get_glyph_index falls back to "?" for codepoints we don't have
+        self.fallback = fallback
+        self._scaled: dict[int, dict[int, float]] = {}
+
+        # Set by GlyphAtlas. Gets handed any characters we've never seen so
+        # it can go rasterize them (and tell us how wide they are)
+        self.on_unseen: Optional[Callable[[set[str]], None]] = None
+        self.known_chars = {chr(cp) for cp in advances} | {" ", "\n"}
+
+    def ensure(self, text: str) -> None:
+        # Call before measuring text that might have new characters in it
+        if self.on_unseen is None:
+            return
+
+        unseen = set(text)
+        unseen -= self.known_chars
+        if unseen:
+            self.on_unseen(unseen)
+            self.known_chars |= unseen
+
+    def add_advances(self, advances: dict[int, float]) -> None:
+        self.advances.update(advances)
+        self.known_chars.update(chr(cp) for cp in advances)
+
+        # Update the scaled copies in place, layout code holds onto them
+        for font_size, scaled in self._scaled.items():
+            factor = font_size / self.base_size
+            for cp, adv in advances.items():
+                scaled[cp] = adv * factor
+
+    def advances_for(self, font_size: int) -> dict[int, float]:
+        # codepoint -> advance at this font size. Built once per size
+        scaled = self._scaled.get(font_size)
+        if scaled is None:
+            factor = font_size / self.base_size
+            scaled = {cp: adv * factor for cp, adv in self.advances.items()}
+            self._scaled[font_size] = scaled
+        return scaled
+
+    def fallback_for(self, font_size: int) -> float:
+        return self.fallback * font_size / self.base_size
+
+    def measure(self, text: str, font_size: int) -> tuple[float, float]:
+        # Same numbers as rl.measure_text_ex(font, text, font_size, 0) without
+        # leaving Python
+        if not text:
+            return (0.0, 0.0)
+
+        self.ensure(text)
+
+        advances = self.advances_for(font_size)
+        fallback = self.fallback_for(font_size)
+
+        lines = text.split("\n")
+        width = 0.0
+        for line in lines:
+            line_width = 0.0
+            for char in line:
+                line_width += advances.get(ord(char), fallback)
+            width = max(width, line_width)
+
+        height = font_size + (font_size + self.LINE_SPACING) * (len(lines) - 1)
+        return (width, height)
+
+# Keyed by the rl.Font returned from load_jagged_ttf
+_loaded_metrics: dict[Any, GlyphMetrics] = {}
+
+def get_metrics(font: rl.Font) -> GlyphMetrics:
+    return _loaded_metrics[font]
+
+# Rasterizing the font and packing the atlas is by far the slowest part of
+# startup, and it comes out the same every time. So the finished atlas, glyph
+# rects and metrics get dumped to a file, and later launches just map that in
+# and upload it.
+ATLAS_CACHE_VERSION = 1
+GLYPH_PADDING = 4
+
+# version, font size, padding, glyph count, atlas width, height, pixel format
+_ATLAS_HEADER = struct.Struct("<7i")
+# value, offsetX, offsetY, advanceX, then the rect (x, y, width, height)
+_ATLAS_GLYPH = struct.Struct("<4i4f")
+
+def atlas_cache_path(data: bytes, font_size: int, cache_dir: Path) -> Path:
+    key = hashlib.sha1(data)
+    key.update(struct.pack("<3i", ATLAS_CACHE_VERSION, font_size, GLYPH_PADDING))
+    key.update(struct.pack(f"<{len(CODEPOINTS)}i", *CODEPOINTS))
+    return cache_dir / f"font-{key.hexdigest()}.bin"
 
+def write_atlas_cache(cache_path: Path, font: rl.Font, atlas: rl.Image) -> None:
+    atlas_size = rl.get_pixel_data_size(atlas.width, atlas.height, atlas.format)
+
+    temp_path = cache_path.with_suffix(".tmp")
+    with open(temp_path, "wb") as file:
+        file.write(_ATLAS_HEADER.pack(
+            ATLAS_CACHE_VERSION,
+            font.baseSize,
+            font.glyphPadding,
+            font.glyphCount,
+            atlas.width,
+            atlas.height,
+            atlas.format
+        ))
+
+        for i in range(font.glyphCount):
+            glyph = font.glyphs[i]
+            rect = font.recs[i]
+            file.write(_ATLAS_GLYPH.pack(
+                glyph.value,
+                glyph.offsetX,
+                glyph.offsetY,
+                glyph.advanceX,
+                rect.x,
+                rect.y,
+                rect.width,
+                rect.height
+            ))
+
+        file.write(rl.ffi.buffer(rl.ffi.cast("char *", atlas.data), atlas_size))
+
+    # Rename into place so a crash mid-write can't leave half a file
+    temp_path.replace(cache_path)
+
+def load_atlas_cache(cache_path: Path) -> Optional[rl.Font]:
+    try:
+        file = open(cache_path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with file:
+        # Too short to even have a header (mmap won't map an empty file
+        # anyway). Same as a miss, we'll just write a new one
+        if os.fstat(file.fileno()).st_size < _ATLAS_HEADER.size:
+            return None
+
+        view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with view:
+        (
+            version,
+            font_size,
+            padding,
+            glyph_count,
+            atlas_width,
+            atlas_height,
+            atlas_format
+        ) = _ATLAS_HEADER.unpack_from(view)
+
+        pixels_at = _ATLAS_HEADER.size + _ATLAS_GLYPH.size * glyph_count
+        atlas_size = rl.get_pixel_data_size(atlas_width, atlas_height, atlas_format)
+        if version != ATLAS_CACHE_VERSION or len(view) != pixels_at + atlas_size:
+            return None
+
+        font = rl.Font()
+        font.baseSize = font_size
+        font.glyphPadding = padding
+        font.glyphCount = glyph_count
+
+        # unload_font frees these with raylib's allocator, so they have to
+        # come from it. Glyph images stay empty: drawing only ever uses the
+        # atlas, and they were only ever copies of it anyway
+        font.glyphs = rl.ffi.cast("GlyphInfo *", rl.mem_alloc(rl.ffi.sizeof("GlyphInfo") * glyph_count))
+        font.recs = rl.ffi.cast("Rectangle *", rl.mem_alloc(rl.ffi.sizeof("Rectangle") * glyph_count))
+
+        for i in range(glyph_count):
+            (
+                value,
+                offset_x,
+                offset_y,
+                advance_x,
+                rect_x,
+                rect_y,
+                rect_width,
+                rect_height
+            ) = _ATLAS_GLYPH.unpack_from(view, _ATLAS_HEADER.size + _ATLAS_GLYPH.size * i)
+
+            glyph = font.glyphs[i]
+            glyph.value = value
+            glyph.offsetX = offset_x
+            glyph.offsetY = offset_y
+            glyph.advanceX = advance_x
+            glyph.image = rl.Image(rl.ffi.NULL, 0, 0, 0, 0)
+
+            rect = font.recs[i]
+            rect.x = rect_x
+            rect.y = rect_y
+            rect.width = rect_width
+            rect.height = rect_height
+
+        # Upload straight out of the mapping, no copy
+        pixels = rl.ffi.from_buffer(view)
+        atlas = rl.Image(pixels + pixels_at, atlas_width, atlas_height, 1, atlas_format)
+        font.texture = rl.load_texture_from_image(atlas)
+        del pixels, atlas
+
+    return font
+
+def rasterize(file_buf: Any, data_len: int, font_size: int, codepoints: tuple[int, ...]) -> tuple[rl.Font, rl.Image]:
+    # Returns the font (no texture yet) and its atlas image. Both are yours
     font = rl.Font()
     font.baseSize = font_size
-    font.glyphPadding = 4
-    font.glyphCount = len(CODEPOINTS)
+    font.glyphPadding = GLYPH_PADDING
+    font.glyphCount = len(codepoints)
 
-    file_buf = rl.ffi.new("unsigned char[]", data)
-    codepoint_buf = rl.ffi.new("int[]", CODEPOINTS)
+    codepoint_buf = rl.ffi.new("int[]", codepoints)
     codepoint_ptr = rl.ffi.cast("int *", codepoint_buf)
 
     font.glyphs = rl.load_font_data(
         rl.ffi.cast("unsigned char *", file_buf),
-        len(data),
+        data_len,
         font_size,
         codepoint_ptr,
         font.glyphCount,
@@ -55,22 +265,194 @@ def load_jagged_ttf(file_name: str, font_size: int):
     image = rl.gen_image_font_atlas(
         font.glyphs,
         rects_ptr,
-        len(CODEPOINTS),
+        len(codepoints),
         font_size,
         font.glyphPadding,
         0
     )
+    font.recs = rects_ptr[0]
+
+    return font, image
+
+def load_jagged_ttf(
+    file_name: str,
+    font_size: int,
+    cache_dir: Optional[Path] = None,
+    data: Optional[bytes] = None
+):
+    # Pass data if you've already read the file
+    if data is None:
+        with open(file_name, "rb") as file:
+            data = file.read()
+
+    cache_path = None
+    if cache_dir:
+        cache_path = atlas_cache_path(data, font_size, cache_dir)
+        font = load_atlas_cache(cache_path)
+        if font:
+            return finish_font(font)
+
+    file_buf = rl.ffi.new("unsigned char[]", data)
+    font, image = rasterize(file_buf, len(data), font_size, CODEPOINTS)
 
     # TODO: Edit texture to do manual flooring so it's not weird and wide
 
-    font.recs = rects_ptr[0]
     font.texture = rl.load_texture_from_image(image);
-    rl.set_texture_filter(font.texture, rl.TEXTURE_FILTER_POINT)
 
     for i in range(font.glyphCount):
         rl.unload_image(font.glyphs[i].image)
         font.glyphs[i].image = rl.image_from_image(image, font.recs[i]);
 
+    if cache_path:
+        write_atlas_cache(cache_path, font, image)
+
     rl.unload_image(image);
 
+    return finish_font(font)
+
+def get_advances(font: rl.Font) -> dict[int, float]:
+    advances = {}
+    for i in range(font.glyphCount):
+        glyph = font.glyphs[i]
+        # Mirror measure_text_ex: use the rect width if there's no advance
+        advances[glyph.value] = glyph.advanceX or (font.recs[i].width + glyph.offsetX)
+    return advances
+
+def finish_font(font: rl.Font) -> rl.Font:
+    rl.set_texture_filter(font.texture, rl.TEXTURE_FILTER_POINT)
+
+    advances = get_advances(font)
+    fallback = advances.get(ord("?"), advances[font.glyphs[0].value])
+    _loaded_metrics[font] = GlyphMetrics(font.baseSize, advances, fallback)
+
     return font
+
+# CHARS is all the base font has. Anything else (accents, more box drawing, a
+# player typing their name in Cyrillic) gets rasterized the first time we see
+# it, PAGE_SIZE codepoints at a time, into a small atlas of its own. Only
+# MAX_PAGES of those stay on the GPU; the least recently drawn one goes first.
+PAGE_SIZE = 128
+MAX_PAGES = 16
+BASE_PAGE = -1
+
+class GlyphAtlas:
+    # This is what Renderable.font is. Draw through split_runs + page so every
+    # run of text goes to the atlas that actually has its glyphs
+
+    def __init__(self, base: Optional[rl.Font], metrics: GlyphMetrics, data: Optional[bytes] = None) -> None:
+        self.base = base
+        self.metrics = metrics
+
+        # Space isn't in CHARS but raylib never draws it anyway
+        self.base_chars = frozenset(CHARS) | {" "}
+
+        # Characters the TTF just doesn't have. They draw as "?", like before
+        self.missing: set[str] = set()
+
+        self.pages: OrderedDict[int, rl.Font] = OrderedDict()
+
+        # No TTF (headless) means no pages, everything goes to the base
+        self._data_len = len(data) if data else 0
+        self._file_buf = rl.ffi.new("unsigned char[]", data) if data else None
+        if data:
+            metrics.on_unseen = self.learn
+
+    def page_key(self, char: str) -> int:
+        if char in self.base_chars or char in self.missing:
+            return BASE_PAGE
+        return ord(char) // PAGE_SIZE
+
+    def page(self, key: int) -> Optional[rl.Font]:
+        if key == BASE_PAGE or self._file_buf is None:
+            return self.base
+
+        page = self.pages.get(key)
+        if page is not None:
+            self.pages.move_to_end(key)
+            return page
+
+        start = key * PAGE_SIZE
+        codepoints = tuple(
+            cp for cp in range(start, start + PAGE_SIZE)
+            if chr(cp) not in self.base_chars
+        )
+
+        page, image = rasterize(self._file_buf, self._data_len, self.metrics.base_size, codepoints)
+        page.texture = rl.load_texture_from_image(image)
+        rl.set_texture_filter(page.texture, rl.TEXTURE_FILTER_POINT)
+        rl.unload_image(image)
+
+        self.pages[key] = page
+        while len(self.pages) > MAX_PAGES:
+            _, evicted = self.pages.popitem(last=False)
+            rl.unload_font(evicted)
+
+        return page
+
+    def learn(self, chars: set[str]) -> None:
+        # Metrics hit characters it's never seen. Rasterize their pages and
+        # hand back the advances
+        advances = {}
+        for key in {ord(char) // PAGE_SIZE for char in chars}:
+            page = self.page(key)
+            found = 0
+            for i in range(page.glyphCount):
+                glyph = page.glyphs[i]
+                if glyph.advanceX or page.recs[i].width:
+                    advances[glyph.value] = glyph.advanceX or (page.recs[i].width + glyph.offsetX)
+                    found += 1
+
+            if not found:
+                # Whole block's missing from the font. No point keeping it
+                del self.pages[key]
+                rl.unload_font(page)
+
+        for char in chars:
+            if ord(char) not in advances:
+                # Not in the font at all. Draws as "?", so it's as wide as one
+                self.missing.add(char)
+                advances[ord(char)] = self.metrics.fallback
+
+        self.metrics.add_advances(advances)
+
+    def split_runs(self, text: str, font_size: int) -> list[tuple[int, str, float]]:
+        # Cuts text into (page key, text, x offset) runs that each draw with a
+        # single font. Almost everything is all base page
+        if self.base_chars.issuperset(text):
+            return [(BASE_PAGE, text, 0.0)]
+
+        advances = self.metrics.advances_for(font_size)
+        fallback = self.metrics.fallback_for(font_size)
+
+        runs = []
+        run_key = None
+        run_chars: list[str] = []
+        run_x = 0.0
+        x = 0.0
+
+        for char in text:
+            key = self.page_key(char)
+            if char in self.missing:
+                char = "?"
+
+            if key != run_key and run_chars:
+                runs.append((run_key, "".join(run_chars), run_x))
+                run_chars = []
+                run_x = x
+
+            run_key = key
+            run_chars.append(char)
+            x += advances.get(ord(char), fallback)
+
+        if run_chars:
+            runs.append((run_key, "".join(run_chars), run_x))
+        return runs
+
+def load_atlas(file_name: str, font_size: int, cache_dir: Optional[Path] = None) -> GlyphAtlas:
+    # Read once: it's hashed for the cache key, rasterized for the base font
+    # and kept around for rasterizing pages later
+    with open(file_name, "rb") as file:
+        data = file.read()
+
+    base = load_jagged_ttf(file_name, font_size, cache_dir, data)
+    return GlyphAtlas(base, get_metrics(base), data)
@@ -1,9 +1,11 @@
+from __future__ import annotations
+
 import asyncio
-import pyray as rl
 from typing import Optional, Any
 
 from game import sfx
 from game.ui import Fade
+from ui import style
 from ui.text import RichTextChunk
 from game.io import print_line, prompt
 from game.items.item import Item
@@ -186,6 +188,9 @@ class TakeCommand(Command):
 
 commands = get_subclasses(Command)
 
+# What the player typed, echoed back
+ECHO_STYLE = style.register((0xFF, 0xFF, 0xBB, 0xFF))
+
 def parse_for_command(command: Command, arg_str: str) -> list:
     # FIXME: Please finish this
     args = []
@@ -202,43 +207,123 @@ def parse_for_command(command: Command, arg_str: str) -> list:
 
     return args
 
+class CommandTrie:
+    # Aliases, one character per level. Finding the longest alias some input
+    # starts with is a single walk down, and so is listing every alias that
+    # starts with something (tab completion)
+
+    __slots__ = ("children", "command", "alias")
+
+    def __init__(self) -> None:
+        self.children: dict[str, CommandTrie] = {}
+        self.command: Optional[Command] = None
+        self.alias: Optional[str] = None
+
+    @classmethod
+    def build(cls, commands: list[Command]) -> CommandTrie:
+        root = cls()
+        for command in commands:
+            for alias in command.pattern[0]:
+                root.insert(alias.lower(), command)
+        return root
+
+    def insert(self, alias: str, command: Command) -> None:
+        node = self
+        for char in alias:
+            node = node.children.setdefault(char, CommandTrie())
+        # Later wins, same as the old alias dict did
+        node.command = command
+        node.alias = alias
+
+    def find(self, prefix: str) -> Optional[CommandTrie]:
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def aliases(self) -> list[str]:
+        # Every alias at or below us
+        out = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.command is not None:
+                out.append(node.alias)
+            stack.extend(node.children.values())
+        return out
+
+def longest_match(command_line: str, tries: list[CommandTrie]) -> tuple[int, Optional[Command]]:
+    # Walks all the tries down the input together. Longest alias wins; on a
+    # tie the later trie (the location's) does
+    nodes = list(tries)
+    best_len = 0
+    best = None
+
+    # An empty alias matches everything
+    for node in nodes:
+        if node.command is not None:
+            best = node.command
+
+    for i, char in enumerate(command_line):
+        nodes = [child for node in nodes if (child := node.children.get(char))]
+        if not nodes:
+            break
+
+        for node in nodes:
+            if node.command is not None:
+                best_len = i + 1
+                best = node.command
+
+    return best_len, best
+
+# Global commands never change. Each location's own commands get their own
+# trie, made on the first visit and again only if its objects change
+global_trie = CommandTrie.build(commands)
+_location_tries: dict[type, tuple[tuple, CommandTrie]] = {}
+
+def command_tries() -> list[CommandTrie]:
+    location = Player.player.location
+    local_commands = tuple(location.applicable_commands())
+
+    cached = _location_tries.get(location)
+    if cached is None or cached[0] != local_commands:
+        cached = _location_tries[location] = (local_commands, CommandTrie.build(local_commands))
+
+    return [global_trie, cached[1]]
+
+def complete_command(partial: str) -> list[str]:
+    # Every command alias that could finish off what's been typed so far
+    partial = partial.lower()
+    out = set()
+    for trie in command_tries():
+        node = trie.find(partial)
+        if node:
+            out.update(node.aliases())
+    return sorted(out)
+
 async def run_command(command_line: str) -> None:
     await print_line(" ")
 
     await print_line(
-        RichTextChunk(
-            f"> {command_line}",
-            color=rl.Color(0xFF, 0xFF, 0xBB, 0xFF)
-        ),
+        RichTextChunk(f"> {command_line}", style=ECHO_STYLE),
         now=True
     )
 
     command_line = command_line.lower()
 
-    alias_to_command = {}
-    for command in commands + Player.player.location.applicable_commands():
-        for alias in command.pattern[0]:
-            alias_to_command[alias] = command
-
-    # Leading option search (longest to shortest; match "look at" before "look")
-    alias_to_command = dict(sorted(
-        alias_to_command.items(),
-        key=lambda x: len(x[0]),
-        reverse=True
-    ))
-
-    for starter, command in alias_to_command.items():
-        # Of course it's gotta be this annoying because we're not just splitting
-        # at spaces and matching. Do I even know if I will have commands with
-        # spaces in them? Nope!
-        if not command_line.startswith(starter): continue
-
-        arg_str = command_line[len(starter):].strip()
-        args = parse_for_command(command, arg_str)
-        await command.execute(args)
-
-        break
-    else:
+    # Leading option search (longest first; match "look at" before "look").
+    # Of course it's gotta be this annoying because we're not just splitting
+    # at spaces and matching. Do I even know if I will have commands with
+    # spaces in them? Nope!
+    starter_len, command = longest_match(command_line, command_tries())
+
+    if command is None:
         # TODO: More helpful errors with like Levenshtein distance
         await print_line("Huh? I don't get that command. Try asking for <act>help</act>.")
+        return
 
+    arg_str = command_line[starter_len:].strip()
+    args = parse_for_command(command, arg_str)
+    await command.execute(args)
@@ -1,10 +1,10 @@
-import time
-import asyncio
 import pyray as rl
 from typing import Optional
 
 from game import ui
 from game.io import wait_for_enter
+from ui.backend import Backend
+from ui.pacing import pacer
 from ui.vector2 import Vector2
 from ui.text import TextRenderable, RichTextChunk, RichText
 from ui.image import ImageRenderable
@@ -23,15 +23,16 @@ async def rich_drip_feed(
     current_len = 0
 
     # OMG, this is so much better than always doing int(time.time()). I feel dumb
-    start_time = time.monotonic()
+    # (Backend clock so headless runs don't wait on real time)
+    start_time = Backend.current.get_time()
 
     while current_len < total_len:
-        if rl.is_key_pressed(rl.KEY_ENTER):
+        if Backend.current.is_key_pressed(rl.KEY_ENTER):
             # TODO: Go faster or skip?? Which is better!?!?!?!?!?!?!?! XP
             yield rt
             return
 
-        elapsed_sec = time.monotonic() - start_time
+        elapsed_sec = Backend.current.get_time() - start_time
         target_len = int(elapsed_sec * chars_per_second)
         target_len = min(target_len, total_len)
 
@@ -40,7 +41,8 @@ async def rich_drip_feed(
             yield rt.get_n_leading(current_len)
 
         if current_len < total_len:
-            await asyncio.sleep(0.0)
+            # Once per frame is plenty, and keeps frames coming while we type
+            await pacer.next_frame()
 
 async def print_dialog(
     line: RichTextChunk | RichText | str,
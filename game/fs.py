@@ -6,3 +6,7 @@ SAVE_DIR = ROOT_DIR / "saves"
 SAVE_DIR.mkdir(parents=True, exist_ok=True)
 
 STATIC_DIR = ROOT_DIR / "static"
+
+# Stuff that's slow to make and safe to throw away (processed backgrounds)
+CACHE_DIR = ROOT_DIR / "cache"
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
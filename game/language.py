@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import re
 import random
+import functools
 from enum import Enum
+from typing import Iterable
 
 class Capitalization(Enum):
     # I am writing this specific class really late so if this is rly stupid dont
@@ -155,28 +157,35 @@ def third_to_base(verb: str) -> str:
     return verb
 
 def evaluate_tag(raw: str, participants: dict[str, LanguageProfile]) -> str:
+    # One-off version of what format() does for each tag
+    return render_op(compile_tag(raw), participants)
+
+# Templates get compiled once into a tuple of ops: plain strings are copied
+# through as-is, tags become one of these (with everything that doesn't depend
+# on who's involved already worked out). The battle messages come out of
+# MessagePools, so the same few templates show up again and again
+OP_NAME = 0        # (OP_NAME, user_key, cap)
+OP_POSSESSIVE = 1  # (OP_POSSESSIVE, user_key, cap, your, fallback op)
+OP_PRONOUN = 2     # (OP_PRONOUN, user_key, {pronoun_set: pronoun})
+OP_VERB = 3        # (OP_VERB, user_key, singular, plural)
+
+def compile_tag(raw: str) -> tuple:
     # Partition won't error if the "." is not present
     raw_user_key, _, word = raw.partition(".")
 
     cap = Capitalization.get(raw_user_key)
     user_key = raw_user_key.lower()
 
-    # {user's}
-    if "'s" in user_key and (plural_user_key := user_key.replace("'s", "")) in participants:
-        user = participants[plural_user_key]
-        if user.pronoun_set == PronounSet.YOU:
-            return Capitalization.to("your", cap)
-        return user.name_format % Capitalization.to(f"{user.name}'s", cap)
-
-    user = participants[user_key]
     # {user}
     if not word:
-        return user.name_format % Capitalization.to(user.name, cap)
+        op = (OP_NAME, user_key, cap)
 
     # {user.he}
-    if word in PRONOUN_SET_MAPPING:
-        pronoun = PRONOUN_SET_MAPPING[word][user.pronoun_set]
-        return Capitalization.to(pronoun, cap)
+    elif word in PRONOUN_SET_MAPPING:
+        op = (OP_PRONOUN, user_key, {
+            pronoun_set: Capitalization.to(pronoun, cap)
+            for pronoun_set, pronoun in PRONOUN_SET_MAPPING[word].items()
+        })
 
     # We also need to handle verb conjugation -_- This is gonna be really 
     # hacky so sorry to any linguists out I don't mean to hurt your feelings
@@ -184,51 +193,116 @@ def evaluate_tag(raw: str, participants: dict[str, LanguageProfile]) -> str:
     # At this point the word should be a verb but I won't install an NLP 
     # library to assert that... we're gonna trust whoever is writing the 
     # input string (me) (untrustworthy)
-    if PronounSet.is_plural(user.pronoun_set):
-        word = third_to_base(word)
-    return Capitalization.to(word, cap)
+    else:
+        op = (
+            OP_VERB,
+            user_key,
+            Capitalization.to(word, cap),
+            Capitalization.to(third_to_base(word), cap)
+        )
+
+    # {user's}. Only if there's somebody called "user" when it's rendered,
+    # otherwise it's whatever it would've been without this
+    if "'s" in user_key:
+        return (
+            OP_POSSESSIVE,
+            user_key.replace("'s", ""),
+            cap,
+            Capitalization.to("your", cap),
+            op
+        )
+
+    return op
+
+def render_op(op: tuple, participants: dict[str, LanguageProfile]) -> str:
+    kind = op[0]
+
+    if kind == OP_POSSESSIVE:
+        user = participants.get(op[1])
+        if user is None:
+            return render_op(op[4], participants)
+        if user.pronoun_set == PronounSet.YOU:
+            return op[3]
+        return user.name_format % Capitalization.to(f"{user.name}'s", op[2])
 
+    user = participants[op[1]]
 
-def format(string: str, **participants: dict[str, LanguageProfile]) -> str:
-    assert all([isinstance(x, LanguageProfile) for x in participants.values()])
+    if kind == OP_NAME:
+        return user.name_format % Capitalization.to(user.name, op[2])
+    if kind == OP_PRONOUN:
+        return op[2][user.pronoun_set]
 
-    # Entirely lifted from ui/text.py, yuck and all
-    default = {"type": "text", "content": ""}
-    bits = [dict(default)]
+    # OP_VERB
+    if PronounSet.is_plural(user.pronoun_set):
+        return op[3]
+    return op[2]
+
+@functools.lru_cache(maxsize=1024)
+def compile_template(string: str) -> tuple:
+    ops = []
+    pos = 0
 
-    for char in string:
-        if char == "{":
-            new = dict(default)
-            new["type"] = "tag"
-            bits.append(new)
-            continue
-        elif char == "}":
-            assert bits[-1]["type"] == "tag"
-            bits.append(dict(default))
-            continue
-        bits[-1]["content"] += char
+    while True:
+        start = string.find("{", pos)
+        end = string.find("}", pos)
 
-    out = ""
+        if start == -1:
+            assert end == -1, f"Stray '}}' in {string!r}"
+            if pos < len(string):
+                ops.append(string[pos:])
+            break
 
-    for bit in bits:
-        if bit["type"] == "text":
-            out += bit["content"]
-            continue
+        assert end == -1 or end > start, f"Stray '}}' in {string!r}"
+        if start > pos:
+            ops.append(string[pos:start])
 
-        # Tag
-        assert bit["type"] == "tag"
-        assert bit["content"]
-        out += evaluate_tag(bit["content"], participants)
+        # An unclosed tag runs to the end
+        if end == -1:
+            end = len(string)
 
-    return out
+        tag = string[start + 1:end]
+        assert tag, f"Empty tag in {string!r}"
+        assert "{" not in tag, f"Nested tag in {string!r}"
+        ops.append(compile_tag(tag))
+        pos = end + 1
 
+    return tuple(ops)
 
+def format(string: str, **participants: dict[str, LanguageProfile]) -> str:
+    assert all([isinstance(x, LanguageProfile) for x in participants.values()])
+
+    out = []
+    for op in compile_template(string):
+        if op.__class__ is str:
+            out.append(op)
+        else:
+            out.append(render_op(op, participants))
+    return "".join(out)
+
+
+# Precompiled once for indefinite_article
+_WORD = re.compile(r"\w+")
+_AN_ABBREVIATION = re.compile(
+    r"(?!FJO|[HLMNS]Y.|RY[EO]|SQU|"
+    r"(F[LR]?|[HL]|MN?|N|RH?|S[CHKLMNPTVW]?|X(YL)?)[AEIOU])"
+    r"[FHLMNRSX][A-Z]"
+)
+_A_PREFIXES = tuple(re.compile(regex) for regex in (
+    r"^e[uw]",
+    r"^onc?e\b",
+    r"^uni([^nmd]|mo)",
+    "^u[bcfhjkqrst][aeiou]",
+))
+_A_UNK = re.compile("^U[NK][AIEO]")
+_AN_Y = re.compile(r"^y(b[lor]|cl[ea]|fere|gg|p[ios]|rou|tt)")
+
+@functools.lru_cache(maxsize=1024)
 def indefinite_article(noun_phrase: str) -> str:
     # Function sourced from IBID with modifications for Python 2 -> 3
     # https://github.com/ibid/ibid/blob/master/ibid/utils/__init__.py
 
     # algorithm adapted from CPAN package Lingua-EN-Inflect-1.891 by Damian Conway
-    m = re.search(r"\w+", noun_phrase)
+    m = _WORD.search(noun_phrase)
     if m:
         word = m.group(0)
     else:
@@ -248,18 +322,15 @@ def indefinite_article(noun_phrase: str) -> str:
         else:
             return "a"
 
-    if re.match(r"(?!FJO|[HLMNS]Y.|RY[EO]|SQU|"
-                  r"(F[LR]?|[HL]|MN?|N|RH?|S[CHKLMNPTVW]?|X(YL)?)[AEIOU])"
-                  r"[FHLMNRSX][A-Z]", word):
+    if _AN_ABBREVIATION.match(word):
         return "an"
 
-    for regex in (r"^e[uw]", r"^onc?e\b",
-                    r"^uni([^nmd]|mo)","^u[bcfhjkqrst][aeiou]"):
-        if re.match(regex, wordi):
+    for regex in _A_PREFIXES:
+        if regex.match(wordi):
             return "a"
 
     # original regex was /^U[NK][AIEO]?/ but that matches UK, UN, etc.
-    if re.match("^U[NK][AIEO]", word):
+    if _A_UNK.match(word):
         return "a"
     elif word == word.upper():
         if wordi[0] in "aedhilmnorsx":
@@ -270,7 +341,11 @@ def indefinite_article(noun_phrase: str) -> str:
     if wordi[0] in "aeio":
         return "an"
 
-    if re.match(r"^y(b[lor]|cl[ea]|fere|gg|p[ios]|rou|tt)", wordi):
+    if _AN_Y.match(wordi):
         return "an"
     else:
         return "a"
+
+def indefinite_articles(noun_phrases: Iterable[str]) -> dict[str, str]:
+    # Bulk version, for looking up everything in a room at once
+    return {noun_phrase: indefinite_article(noun_phrase) for noun_phrase in noun_phrases}
@@ -101,21 +101,37 @@ class Location(metaclass=LocationMeta):
     def lookup(name: str) -> Location:
         return LocationMeta.locations[name]
 
+    @classmethod
+    def resolve_articles(cls) -> dict[str, str]:
+        # "a"/"an" for every route and object here, worked out on the first
+        # visit and kept on the class. Redone if what's here ever changes
+        nouns = tuple(cls.pathways) + tuple(obj.name for obj in cls.objects)
+
+        cached = cls.__dict__.get("_articles")
+        if cached and cached[0] == nouns:
+            return cached[1]
+
+        articles = language.indefinite_articles(nouns)
+        cls._articles = (nouns, articles)
+        return articles
+
     @classmethod
     async def describe(cls) -> None:
+        articles = cls.resolve_articles()
+
         await print_line(f"You look around the {cls.display_name}.")
         await print_line(cls.display_description)
 
         if cls.pathways:
             await print_line(f"<gray>You can move from here:</gray>")
         for route, location in cls.pathways.items():
-            article = language.indefinite_article(route)
+            article = articles[route]
             await print_line(f"- There is {article} <paleyellow>{route}</paleyellow> to {location.display_name} here.")
 
         if cls.objects:
             await print_line(f"<gray>You see some stuff here:</gray>")
         for obj in cls.objects:
-            await print_line(f"<gray>-</gray> There is {obj.article} {obj.display_name} here.")
+            await print_line(f"<gray>-</gray> There is {articles[obj.name]} {obj.display_name} here.")
             for relation, items in obj.item_locations.items():
                 for item in items:
                     await print_line(f"    <gray>-</gray> {relation.title()} the {obj.display_name}, there is a {item.name}.")
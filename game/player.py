@@ -58,7 +58,7 @@ class Player:
         # Setters can't be async
         self.location = location
 
-        ui.change_background(location.name.lower().replace(" ", "_"))
+        await ui.change_background(location.name.lower().replace(" ", "_"))
 
     async def post_location_change(self, location: Location) -> None:
         # Split so we don't wait for the printing in the loading screen
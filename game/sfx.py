@@ -1,63 +1,402 @@
+import time
+import queue
 import asyncio
+import threading
+import traceback
 import pyray as rl
+from collections import OrderedDict
 from typing import Optional
 
 from game import fs
+from ui.backend import Backend
+
+# Without an audio device (headless), everything in here quietly does nothing
+audio = Backend.current.audio_ready
+
+# Nothing's loaded until it's first played (or prefetched), we just remember
+# where everything is. Loaded sounds stay around until they push us over the
+# budget, least recently played goes first
+SOUND_BUDGET_BYTES = 32 * 1024 * 1024
+
+sound_paths = {path.stem: path for path in (fs.STATIC_DIR / "sfx").glob("*.ogg")}
+
+cached_sounds: OrderedDict[str, rl.Sound] = OrderedDict()
+cached_bytes = 0
+
+_pending_loads: set[str] = set()
+_prefetch_tasks: set[asyncio.Task] = set()
+_warned: set[str] = set()
+
+def _warn_unknown(kind: str, name: str) -> None:
+    # Typos shouldn't crash the game. Just complain (once)
+    if name in _warned:
+        return
+    _warned.add(name)
+    print(f"[sfx] No {kind} called '{name}'!")
+
+def _sound_bytes(sound: rl.Sound) -> int:
+    return sound.frameCount * sound.stream.channels * sound.stream.sampleSize // 8
+
+def _add_sound(name: str, sound: rl.Sound) -> None:
+    global cached_bytes
+
+    cached_sounds[name] = sound
+    cached_bytes += _sound_bytes(sound)
+
+    # Sounds that are playing right now (on any voice) can't go
+    for old_name, old in list(cached_sounds.items()):
+        if cached_bytes <= SOUND_BUDGET_BYTES:
+            break
+        if old_name == name or _is_busy(old_name):
+            continue
+
+        # Finished voices can still be in _playing until the next prune.
+        # They're about to be freed, so forget them now
+        _playing[:] = [entry for entry in _playing if entry[1] != old_name]
+
+        # Aliases share the sound's samples, so they go first
+        for alias in _voice_pools.pop(old_name, [])[1:]:
+            rl.unload_sound_alias(alias)
+
+        del cached_sounds[old_name]
+        cached_bytes -= _sound_bytes(old)
+        rl.unload_sound(old)
+
+def get_sound(name: str) -> Optional[rl.Sound]:
+    if not audio: return None
+
+    sound = cached_sounds.get(name)
+    if sound:
+        cached_sounds.move_to_end(name)
+        return sound
+
+    path = sound_paths.get(name)
+    if not path:
+        _warn_unknown("sound", name)
+        return None
 
-cached_sounds = {}
-for path in (fs.STATIC_DIR / "sfx").glob("*.ogg"):
     print(f"[sfx] Loading {path.name}...")
-    cached_sounds[path.stem] = rl.load_sound(str(path))
+    sound = rl.load_sound(str(path))
+    _add_sound(name, sound)
+    return sound
+
+async def _load_in_background(name: str) -> None:
+    # Decoding happens on a worker thread, only handing it to the audio device
+    # happens here
+    path = sound_paths[name]
+    wave = await Backend.current.run_in_background(rl.load_wave, str(path))
+    _pending_loads.discard(name)
+
+    if name in cached_sounds:
+        # Got played (and loaded the slow way) while we were at it
+        rl.unload_wave(wave)
+        return
+
+    _add_sound(name, rl.load_sound_from_wave(wave))
+    rl.unload_wave(wave)
+
+def prefetch(*names: str) -> None:
+    # Hint that these are about to be played so they're ready when they are.
+    # Returns right away
+    if not audio: return
+
+    for name in names:
+        if name in cached_sounds or name in _pending_loads:
+            continue
+        if name not in sound_paths:
+            _warn_unknown("sound", name)
+            continue
+
+        _pending_loads.add(name)
+        task = asyncio.get_running_loop().create_task(_load_in_background(name))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+
+# Mixer. Each sound gets a small pool of voices (aliases sharing its samples)
+# so the same effect can overlap itself, and there's a cap on how many voices
+# play at once overall. When we're full, a new sound steals the oldest voice
+# of the least important category, or doesn't play if everything playing
+# matters more than it does.
+
+VOICES_PER_SOUND = 4
+MAX_VOICES = 16
+
+# Higher wins
+CATEGORY_PRIORITY = {
+    "ambient": 0,
+    "effect": 1,
+    "ui": 2,
+    "story": 3,
+}
+
+SOUND_CATEGORIES = {
+    "intro": "story",
+    "item": "ui",
+    "walk_wood": "ambient",
+}
+
+# name -> [sound, alias, alias, ...]
+_voice_pools: dict[str, list[rl.Sound]] = {}
+
+# (voice, name, priority, started at), oldest first. Pruned as voices finish
+_playing: list[tuple[rl.Sound, str, int, float]] = []
+
+def _prune_finished() -> None:
+    _playing[:] = [entry for entry in _playing if rl.is_sound_playing(entry[0])]
+
+def _is_busy(name: str) -> bool:
+    return any(rl.is_sound_playing(voice) for voice in _voice_pools.get(name, ()))
+
+def _stop_voice(voice: rl.Sound) -> None:
+    rl.stop_sound(voice)
+    _playing[:] = [entry for entry in _playing if entry[0] is not voice]
+
+def _pick_voice(name: str, sound: rl.Sound) -> rl.Sound:
+    pool = _voice_pools.setdefault(name, [sound])
+
+    for voice in pool:
+        if not rl.is_sound_playing(voice):
+            return voice
+
+    if len(pool) < VOICES_PER_SOUND:
+        voice = rl.load_sound_alias(sound)
+        pool.append(voice)
+        return voice
+
+    # All of this sound's voices are busy. Restart the oldest one
+    for voice, voice_name, _, _ in _playing:
+        if voice_name == name:
+            _stop_voice(voice)
+            return voice
+    return pool[0]
+
+def _play(name: str) -> Optional[tuple[rl.Sound, str, int, float]]:
+    # Before loading anything, since that can evict (and free) sounds
+    _prune_finished()
+
+    sound = get_sound(name)
+    if not sound: return None
+
+    priority = CATEGORY_PRIORITY[SOUND_CATEGORIES.get(name, "effect")]
+
+    if len(_playing) >= MAX_VOICES:
+        # Oldest of the lowest priority (the list is oldest first)
+        victim = min(_playing, key=lambda entry: entry[2])
+        if victim[2] > priority:
+            return None
+        _stop_voice(victim[0])
+
+    voice = _pick_voice(name, sound)
+    rl.play_sound(voice)
+
+    entry = (voice, name, priority, time.monotonic())
+    _playing.append(entry)
+    return entry
 
 def play_sound(sound_str: str) -> None:
-    # TODO: Some protection against crashing instantly on typos...
-    rl.play_sound(cached_sounds[sound_str])
+    _play(sound_str)
 
 async def await_sound(
     sound_str: str,
     stop_at: Optional[float] = None
 ) -> None:
-    sound = cached_sounds[sound_str]
-    rl.play_sound(sound)
+    entry = _play(sound_str)
+    if not entry: return
 
-    if not sound.stream.sampleRate:
+    voice = entry[0]
+    if not voice.stream.sampleRate:
         print("[sfx] ???")
         return
 
-    duration_secs = stop_at or (sound.frameCount / sound.stream.sampleRate)
+    duration_secs = stop_at or (voice.frameCount / voice.stream.sampleRate)
     await asyncio.sleep(duration_secs)
 
-    rl.stop_sound(sound)
+    # Unless it's been stolen (and restarted for somebody else) since
+    if any(playing is entry for playing in _playing):
+        _stop_voice(voice)
 
 # Music (last 20 minutes before 7 pm goodbye)
+#
+# Music gets its own thread. Streams need topping up every few dozen ms or
+# they stutter, and the render loop can't promise that (slow frames, long
+# coroutines, or the pacer deciding nothing needs drawing). Everything below
+# that touches a music stream runs on that thread; the functions the game
+# calls just drop commands in its queue.
+
+MUSIC_TICK = 1 / 100
+
+# Music streams from disk as it plays, so "loading" one is just opening the
+# file. Only the ones playing are kept open
+music_paths = {path.stem: path for path in (fs.STATIC_DIR / "music").glob("*.mp3")}
 
 class Music:
     def __init__(self, data, loop=False):
         self.data = data
         self.loop = loop
 
-cached_music = {}
-for path in (fs.STATIC_DIR / "music").glob("*.mp3"):
-    print(f"[sfx] Loading {path.name}...")
-    cached_music[path.stem] = Music(rl.load_music_stream(str(path)))
+        # Faded towards target at rate (per second). Stopped and closed when
+        # it gets to silence if stop_when_silent
+        self.volume = 1.0
+        self.target = 1.0
+        self.rate = 0.0
+        self.stop_when_silent = False
+
+class MusicThread(threading.Thread):
+    def __init__(self) -> None:
+        super().__init__(name="music", daemon=True)
+        self.commands: queue.Queue[tuple] = queue.Queue()
+        self.master_volume = 1.0
+
+        # Only touched on our thread
+        self.streams: dict[str, Music] = {}
+
+    def run(self) -> None:
+        last_tick = time.monotonic()
+        while True:
+            try:
+                command = self.commands.get(timeout=MUSIC_TICK)
+                while True:
+                    if command[0] == "quit":
+                        self.close_all()
+                        return
+                    self.dispatch(command)
+                    command = self.commands.get_nowait()
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            try:
+                self.tick(now - last_tick)
+            except Exception:
+                # Same deal as dispatch
+                print("[sfx] Music tick failed!")
+                traceback.print_exc()
+            last_tick = now
 
-def play_music(sound_str: str) -> None:
-    music = cached_music[sound_str]
-    music.loop = True
-    print(music.data)
-    rl.play_music_stream(music.data)
+    def dispatch(self, command: tuple) -> None:
+        # One bad command (a file raylib can't open, say) shouldn't kill the
+        # thread. Nobody would notice, and every command after it would just
+        # pile up in the queue
+        try:
+            getattr(self, f"do_{command[0]}")(*command[1:])
+        except Exception:
+            print(f"[sfx] Music command {command!r} failed!")
+            traceback.print_exc()
 
-def stop_music(sound_str: str) -> None:
-    music = cached_music[sound_str]
-    music.loop = False
-    rl.stop_music_stream(music.data)
+    def open(self, name: str) -> Music:
+        music = self.streams.get(name)
+        if not music:
+            print(f"[sfx] Opening {music_paths[name].name}...")
+            music = self.streams[name] = Music(rl.load_music_stream(str(music_paths[name])))
+        return music
 
-def music_loop_tick() -> None:
-    for music in cached_music.values():
-        if not music.loop:
-            continue 
+    def close(self, name: str) -> None:
+        music = self.streams.pop(name)
+        rl.stop_music_stream(music.data)
+        rl.unload_music_stream(music.data)
 
-        rl.update_music_stream(music.data)
+    def close_all(self) -> None:
+        for name in list(self.streams):
+            self.close(name)
+
+    def fade(self, music: Music, target: float, duration: float) -> None:
+        music.target = target
+        if duration <= 0:
+            music.volume = target
+            music.rate = 0.0
+        else:
+            music.rate = abs(target - music.volume) / duration
+
+    def do_play(self, name: str, fade_in: float) -> None:
+        music = self.open(name)
+        music.loop = True
+        music.stop_when_silent = False
 
         if not rl.is_music_stream_playing(music.data):
-             rl.play_music_stream(music.data)
+            music.volume = 0.0 if fade_in > 0 else 1.0
+            self.apply_volume(music)
+            rl.play_music_stream(music.data)
+        self.fade(music, 1.0, fade_in)
+
+    def do_stop(self, name: str, fade_out: float) -> None:
+        music = self.streams.get(name)
+        if not music:
+            return
+
+        music.stop_when_silent = True
+        self.fade(music, 0.0, fade_out)
+
+    def do_crossfade(self, name: str, duration: float) -> None:
+        for other in list(self.streams):
+            if other != name:
+                self.do_stop(other, duration)
+        self.do_play(name, duration)
+
+    def do_volume(self, volume: float) -> None:
+        self.master_volume = volume
+        for music in self.streams.values():
+            self.apply_volume(music)
+
+    def apply_volume(self, music: Music) -> None:
+        rl.set_music_volume(music.data, music.volume * self.master_volume)
+
+    def tick(self, elapsed: float) -> None:
+        for name, music in list(self.streams.items()):
+            if music.volume != music.target:
+                step = music.rate * elapsed
+                if abs(music.target - music.volume) <= step:
+                    music.volume = music.target
+                elif music.target > music.volume:
+                    music.volume += step
+                else:
+                    music.volume -= step
+                self.apply_volume(music)
+
+            if music.stop_when_silent and music.volume <= 0.0:
+                self.close(name)
+                continue
+
+            rl.update_music_stream(music.data)
+
+            if music.loop and not rl.is_music_stream_playing(music.data):
+                rl.play_music_stream(music.data)
+
+_music_thread: Optional[MusicThread] = None
+
+def _send(*command) -> None:
+    global _music_thread
+
+    if _music_thread is None:
+        _music_thread = MusicThread()
+        _music_thread.start()
+    _music_thread.commands.put(command)
+
+def _check_music(name: str) -> bool:
+    if name in music_paths:
+        return True
+    _warn_unknown("music", name)
+    return False
+
+def play_music(sound_str: str, fade_in: float = 0.0) -> None:
+    if not audio or not _check_music(sound_str): return
+    _send("play", sound_str, fade_in)
+
+def stop_music(sound_str: str, fade_out: float = 0.0) -> None:
+    if not audio or not _check_music(sound_str): return
+    _send("stop", sound_str, fade_out)
+
+def crossfade_music(sound_str: str, duration: float = 1.0) -> None:
+    # Fades everything else out while this fades in
+    if not audio or not _check_music(sound_str): return
+    _send("crossfade", sound_str, duration)
+
+def set_music_volume(volume: float) -> None:
+    if not audio: return
+    _send("volume", volume)
+
+def shutdown() -> None:
+    # Close the streams before the audio device goes away under them
+    if _music_thread is None:
+        return
+    _music_thread.commands.put(("quit",))
+    _music_thread.join()
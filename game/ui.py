@@ -1,17 +1,21 @@
 import time
-import asyncio
 import pyray as rl
 from pathlib import Path
 from typing import Optional
 
+from game import fs
 from ui.vector2 import Vector2
 from ui.renderable import Renderable, EmptyRenderable, OverlayRenderable
-from ui.container import VAlign, VStackContainer, HStackContainer, Container
+from ui.container import VStackContainer, HStackContainer, Container, LogContainer
 from ui.text import TextRenderable, InputRenderable, RichTextChunk, RichText
 from ui.image import ImageRenderable
+from ui.pacing import pacer
+from ui.anim import animator
 
 class Fade:
-    active_fade = None
+    # Fades the overlay over everything. speed is how much the alpha moves per
+    # frame at 60 FPS (what this used to step by every frame), so the old
+    # numbers all still mean the same thing
 
     def __init__(
         self,
@@ -24,47 +28,18 @@ class Fade:
         assert self.target >= 0.0
         assert self.target <= 1.0
 
-        loop = asyncio.get_running_loop()
-        self.future = loop.create_future()
-
     async def wait_for(self) -> None:
-        Fade.active_fade = self
-        await self.future
-
-    def step(self) -> None:
-        alpha = overlay_rect.color[3] / 0xFF
-
-        delta = self.target - alpha
-        # HACK: Avoid div by zero if we're right on the money
-        delta = delta or 0.0001
-
-        sign = delta / abs(delta)
-        inch = sign * self.speed
-
-        alpha = max(0.0, min(1.0, alpha + inch))
-        Fade.set_overlay_alpha(alpha)
-
-        if (
-            (sign == -1 and alpha <= self.target)
-            or
-            (sign == 1 and alpha >= self.target)
-        ):
-            self.future.set_result(None)
-            Fade.active_fade = None
-
-    @classmethod
-    def step_active(cls) -> None:
-        if not cls.active_fade:
-            return
-        cls.active_fade.step()
+        duration = abs(self.target - overlay_rect.alpha) / (self.speed * 60)
+        await animator.tween(overlay_rect, "alpha", self.target, duration)
 
     @staticmethod
     def set_overlay_alpha(alpha: float) -> None:
-        overlay_rect.color = (0x0, 0x0, 0x0, int(0xFF * alpha))
+        animator.cancel(overlay_rect, "alpha")
+        overlay_rect.alpha = alpha
 
 
 def ui_process() -> None:
-    Fade.step_active()
+    animator.step()
 
 def switch_active_text_container(cont: Renderable) -> None:
     global active_text_container
@@ -73,14 +48,14 @@ def switch_active_text_container(cont: Renderable) -> None:
     active_text_container = cont
     active_text_container.active = True
 
-def change_background(background: str) -> None:
+async def change_background(background: str) -> None:
     bg_path = Path("static/bg") / f"{background}.jpg"
 
     if not bg_path.is_file():
-        bg_img.loaded = False
+        bg_img.unload()
         return
 
-    bg_img.load(str(bg_path))
+    await bg_img.load_async(str(bg_path), cache_dir=fs.CACHE_DIR)
 
 ui_root = EmptyRenderable()
 bg_img = ImageRenderable(is_bg_image=True, parent=ui_root)
@@ -102,14 +77,12 @@ battle_stats = TextRenderable(
     active=False
 )
 
-story_text_container = VStackContainer(
-    v_align=VAlign.BOTTOM,
+story_text_container = LogContainer(
     parent=big_container,
     name="StoryText"
 )
 
-battle_text_container = VStackContainer(
-    v_align=VAlign.BOTTOM,
+battle_text_container = LogContainer(
     parent=big_container,
     active=False,
     name="BattleText"
@@ -123,6 +96,8 @@ input_box = InputRenderable(
 
 active_text_container = story_text_container
 
+pacer.add_activity_check(input_box.holding_key)
+
 print(big_container.active_children)
 
 # HSPLIT THE TWO PARTIES HEALTHWISE
@@ -4,27 +4,41 @@ import sys
 import pyray as rl
 import asyncio
 
+from ui.backend import Backend, RaylibBackend, HeadlessBackend
+
 print("\nTake a look!\n")
 
+if "--headless" in sys.argv:
+    # --script is a file with one line of input per line. An empty line is
+    # just pressing enter
+    script = []
+    if "--script" in sys.argv:
+        with open(sys.argv[sys.argv.index("--script") + 1], "r") as file:
+            script = file.read().splitlines()
+    Backend.current = HeadlessBackend(script)
+else:
+    Backend.current = RaylibBackend()
+
+backend = Backend.current
+
 # The window needs to be initalized before about anything can happen
 # without segfaults
-rl.set_trace_log_level(rl.TraceLogLevel.LOG_WARNING)
-rl.set_window_state(rl.ConfigFlags.FLAG_WINDOW_RESIZABLE | rl.ConfigFlags.FLAG_WINDOW_HIGHDPI)
-rl.init_window(800, 450, "The Manor Claire")
-rl.init_audio_device()
-rl.set_target_fps(60)
+backend.init_window(800, 450, "The Manor Claire")
+backend.init_audio_device()
 
 from ui.vector2 import Vector2
 from ui.renderable import Renderable
 from ui.container import HStackContainer, HAlign
 from ui.image import ImageRenderable
+from ui.profiler import FrameProfiler
+from ui.pacing import pacer
 
-from etc import font
+from game import fs
 from game import ui
 from game import sfx
 from game import story
 from game.io import prompt, choice_prompt, print_line, clear_lines
-from game.cmd import run_command
+from game.cmd import run_command, complete_command
 from game.combat import battle
 from game.dialog import print_dialog
 from game.player import Player
@@ -32,40 +46,93 @@ from game.ui import Fade
 
 # Font loading has to be done after the rl context is initalized. Pretty hacky
 # but whatevs...
-Renderable.font = font.load_jagged_ttf("static/unscii-16.ttf", 16);
-render_scale = rl.get_screen_height() / 720
-Renderable.font_size = round(Renderable.font.baseSize / render_scale / 16) * 16
+Renderable.font, Renderable.glyph_metrics = backend.load_font(
+    "static/unscii-16.ttf",
+    16,
+    cache_dir=fs.CACHE_DIR
+)
+render_scale = backend.get_screen_height() / 720
+Renderable.font_size = round(Renderable.glyph_metrics.base_size / render_scale / 16) * 16
 
 # HACK: Set input_box's static size to it's measurement to prevent weird sizing
 # HACK: Also has to be down here because of delayed font loading :(
 ui.input_box.static_size = ui.input_box.measure()
 ui.battle_stats.static_size = ui.battle_stats.measure()
 
+if isinstance(backend, HeadlessBackend):
+    # Only type the next scripted line once the game actually asks for one
+    backend.input_wanted = lambda: ui.input_box.future is not None
+
+    # Virtual time only moves when frames are drawn, so never sit idle
+    pacer.enabled = False
+
+
+profile_csv = None
+if "--profile-csv" in sys.argv:
+    profile_csv = sys.argv[sys.argv.index("--profile-csv") + 1]
+profiler = FrameProfiler(
+    csv_path=profile_csv,
+    idle_clock=lambda: pacer.selector.waited
+)
+pacer.add_activity_check(lambda: profiler.visible)
 
 async def render_and_process() -> None:
-    while not rl.window_should_close():
-        if rl.is_key_pressed(rl.KEY_F11):
-            rl.toggle_borderless_windowed()
+    # Reused every frame
+    screen_size = Vector2.zero()
+    origin = Vector2.zero()
+
+    while not backend.window_should_close():
+        # Whatever the last poll picked up (end_drawing's, or the idle one
+        # below). This has to be looked at before anything polls again, or
+        # input that came in while a frame was drawing is gone
+        if backend.has_input_events():
+            pacer.request_redraw()
+
+        if not pacer.should_draw():
+            # Nothing's moving. Wait for something to happen, then keep an
+            # ear out for input
+            await pacer.idle()
+            backend.poll_input_events()
+            continue
+
+        profiler.begin_frame()
+
+        if backend.is_key_pressed(rl.KEY_F11):
+            backend.toggle_borderless_windowed()
+
+        if backend.is_key_pressed(rl.KEY_F3):
+            profiler.visible = not profiler.visible
 
         ui.ui_process()
-        sfx.music_loop_tick()
+        profiler.mark("process")
 
-        ui.ui_root.reflow_layout(Vector2(
-            rl.get_render_width(),
-            rl.get_render_height()
+        ui.ui_root.reflow_layout(screen_size.set(
+            backend.get_render_width(),
+            backend.get_render_height()
         ))
+        profiler.mark("reflow")
 
-        rl.begin_drawing()
-        rl.clear_background(rl.BLACK)
+        backend.begin_drawing()
+        backend.clear_background(rl.BLACK)
 
-        ui.ui_root.render(Vector2.zero())
+        ui.ui_root.render(origin)
+        profiler.draw(Renderable.font, Renderable.glyph_metrics.base_size)
+        profiler.mark("render")
 
-        rl.end_drawing()
+        backend.end_drawing()
+        profiler.mark("present")
+        pacer.frame_drawn()
 
         # Yield
         await asyncio.sleep(0)
+        profiler.mark("coroutines")
+
+        profiler.end_frame()
+
+        # Sleep off the rest of the frame. Coroutines that wake up in here
+        # count towards the next frame
+        await pacer.pace()
 
-    rl.close_window()
     sys.exit(0)
 
 async def main_menu() -> None:
@@ -79,7 +146,7 @@ async def main_menu() -> None:
         padding=Vector2(0, 500)
     )
     ImageRenderable("static/ui/title.png", parent=center_cont, scale=3.0)
-    ui.change_background("menu")
+    await ui.change_background("menu")
 
     await Fade(0.0).wait_for()
 
@@ -106,6 +173,9 @@ async def main_menu() -> None:
         "<darkred>Chicken Out To Desktop</darkred>": "QUIT",
     }
 
+    # Starting a new game opens with this
+    sfx.prefetch("intro")
+
     if Player.SAVE_PATH.is_file():
         options = {"<palegreen>Continue Your Adventure</palegreen>": "CONTINUE"} | options
 
@@ -133,8 +203,11 @@ async def linear() -> None:
     await Player.player.set_location(Player.player.location)
     await Player.player.location.describe()
 
+    # Walking around and picking things up
+    sfx.prefetch("walk_wood", "item")
+
     while True:
-        command_line = await prompt("[cmd]")
+        command_line = await prompt("[cmd]", completer=complete_command)
         await run_command(command_line)
 
 async def main() -> None:
@@ -147,4 +220,24 @@ async def main() -> None:
         # A little questionable...
         pass
 
-asyncio.run(main())
+# Headless swaps in an event loop that runs on its own frame clock. However
+# we get out of here (closing the window, QUIT from the menu, a crash), the
+# profiler's CSV gets flushed, the music thread is stopped and the window goes
+# away. asyncio.run can't take a loop before 3.11, so this is it done by hand
+loop = backend.new_event_loop()
+asyncio.set_event_loop(loop)
+try:
+    loop.run_until_complete(main())
+finally:
+    # Same cleanup asyncio.run does
+    pending = asyncio.all_tasks(loop)
+    for task in pending:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    asyncio.set_event_loop(None)
+    loop.close()
+
+    profiler.close()
+    sfx.shutdown()
+    backend.close_window()
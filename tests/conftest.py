@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+# Tests import game modules straight from the repo, same as main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ui.backend import Backend, HeadlessBackend
+
+# Lots of modules look at the backend when they're imported
+Backend.current = HeadlessBackend()
@@ -0,0 +1,18 @@
+import pytest
+
+from etc import font
+from ui import image
+
+# A cache file that got cut short (full disk, killed mid-copy) is just a miss
+
+@pytest.mark.parametrize("size", [0, 1, font._ATLAS_HEADER.size - 1, font._ATLAS_HEADER.size])
+def test_truncated_atlas_cache_is_a_miss(tmp_path, size):
+    cache_path = tmp_path / "font.bin"
+    cache_path.write_bytes(b"\x01" * size)
+    assert font.load_atlas_cache(cache_path) is None
+
+@pytest.mark.parametrize("size", [0, 1, image._CACHE_HEADER.size - 1])
+def test_truncated_background_cache_is_a_miss(tmp_path, size):
+    cache_path = tmp_path / "background.bin"
+    cache_path.write_bytes(b"\x01" * size)
+    assert image._read_cached_image(cache_path) is None
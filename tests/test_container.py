@@ -0,0 +1,53 @@
+import pytest
+
+from ui.backend import Backend
+from ui.container import LogContainer
+from ui.renderable import Renderable
+from ui.text import TextRenderable
+from ui.vector2 import Vector2
+
+@pytest.fixture(autouse=True)
+def font(monkeypatch):
+    atlas, metrics = Backend.current.load_font("static/unscii-16.ttf", 16)
+    monkeypatch.setattr(Renderable, "font", atlas, raising=False)
+    monkeypatch.setattr(Renderable, "glyph_metrics", metrics, raising=False)
+    monkeypatch.setattr(Renderable, "font_size", 16, raising=False)
+
+def settle(log: LogContainer, height: float) -> None:
+    # Dropping or restoring lines dirties the log again, same as a frame
+    # later would pick up
+    for _ in range(3):
+        log.reflow_layout(Vector2(800, height))
+
+def lines(log: LogContainer) -> list[str]:
+    return [child.text.get_raw() for child in log._children]
+
+def test_lines_come_back_when_the_log_grows():
+    log = LogContainer()
+    for i in range(40):
+        TextRenderable(f"line {i}", parent=log)
+
+    settle(log, 900)
+    assert len(log._children) == 40
+    top = log._children[0].position.y
+
+    settle(log, 200)
+    assert len(log._children) < 40
+    assert lines(log)[-1] == "line 39"
+
+    settle(log, 900)
+    assert lines(log) == [f"line {i}" for i in range(40)]
+    assert log._children[0].position.y == top
+    assert not log.history
+
+def test_cleared_lines_stay_gone():
+    log = LogContainer()
+    for i in range(40):
+        TextRenderable(f"line {i}", parent=log)
+    settle(log, 200)
+    assert log.history
+
+    log.clear_children()
+    TextRenderable("fresh", parent=log)
+    settle(log, 900)
+    assert lines(log) == ["fresh"]
@@ -0,0 +1,50 @@
+import re
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Start a new game, skip through the intro and poke around a bit
+SCRIPT = ["1"] + [""] * 30 + [
+    "help",
+    "look",
+    "look coatrack",
+    "take coat",
+    "go arched",
+    "look",
+]
+
+def run_headless(tmp_path: Path) -> int:
+    # Each run gets its own copy of the game, so saves (and caches) from
+    # earlier runs (or actually playing it) can't change what happens
+    tmp_path.mkdir()
+    for name in ("etc", "game", "ui"):
+        shutil.copytree(ROOT_DIR / name, tmp_path / name, ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copy(ROOT_DIR / "main.py", tmp_path)
+    (tmp_path / "static").symlink_to(ROOT_DIR / "static")
+
+    script = tmp_path / "script.txt"
+    script.write_text("\n".join(SCRIPT) + "\n")
+
+    result = subprocess.run(
+        [sys.executable, "main.py", "--headless", "--script", str(script)],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Traceback" not in result.stdout + result.stderr
+
+    match = re.search(r"\[headless\] (\d+) frames", result.stdout)
+    assert match, result.stdout
+    return int(match.group(1))
+
+def test_same_script_same_frames(tmp_path):
+    # Game time is counted in frames, so anything that takes real time
+    # (loading on a thread, say) shows up here as runs that disagree
+    first = run_headless(tmp_path / "first")
+    second = run_headless(tmp_path / "second")
+    assert first == second
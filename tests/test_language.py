@@ -0,0 +1,106 @@
+import ast
+import itertools
+from pathlib import Path
+
+import pytest
+
+from game import language
+from game.language import Capitalization, LanguageProfile, PronounSet
+
+GAME_DIR = Path(__file__).resolve().parent.parent / "game"
+
+def reference_tag(raw: str, participants: dict[str, LanguageProfile]) -> str:
+    # How tags were rendered before templates got compiled
+    raw_user_key, _, word = raw.partition(".")
+
+    cap = Capitalization.get(raw_user_key)
+    user_key = raw_user_key.lower()
+
+    if "'s" in user_key and (plural_user_key := user_key.replace("'s", "")) in participants:
+        user = participants[plural_user_key]
+        if user.pronoun_set == PronounSet.YOU:
+            return Capitalization.to("your", cap)
+        return user.name_format % Capitalization.to(f"{user.name}'s", cap)
+
+    user = participants[user_key]
+    if not word:
+        return user.name_format % Capitalization.to(user.name, cap)
+
+    if word in language.PRONOUN_SET_MAPPING:
+        pronoun = language.PRONOUN_SET_MAPPING[word][user.pronoun_set]
+        return Capitalization.to(pronoun, cap)
+
+    if PronounSet.is_plural(user.pronoun_set):
+        word = language.third_to_base(word)
+    return Capitalization.to(word, cap)
+
+def reference_format(string: str, **participants: LanguageProfile) -> str:
+    bits = [["text", ""]]
+    for char in string:
+        if char == "{":
+            bits.append(["tag", ""])
+        elif char == "}":
+            assert bits[-1][0] == "tag"
+            bits.append(["text", ""])
+        else:
+            bits[-1][1] += char
+
+    return "".join(
+        content if kind == "text" else reference_tag(content, participants)
+        for kind, content in bits
+    )
+
+def game_templates() -> list[str]:
+    # Every string handed to language.format or a MessagePool in the game
+    templates = set()
+    for path in GAME_DIR.rglob("*.py"):
+        for node in ast.walk(ast.parse(path.read_text())):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            if ast.unparse(node.func) not in ("language.format", "MessagePool"):
+                continue
+            for const in ast.walk(node.args[0]):
+                if isinstance(const, ast.Constant) and isinstance(const.value, str):
+                    templates.add(const.value)
+    return sorted(templates)
+
+# Things the game doesn't happen to say (yet)
+EXTRA_TEMPLATES = [
+    "{USER} {user.HIS} {user.himself} {target.hers} {User.Him} {user.Catches}",
+    "{user.fixes} {target.tries} {user.does} {target.has} {user.watches}",
+    "{user's} thing and {TARGET'S} stuff and {Target's} other stuff",
+    "{User} trails off {target.is",
+    "plain",
+    "",
+]
+
+def test_found_game_templates():
+    assert len(game_templates()) > 10
+
+@pytest.mark.parametrize("template", game_templates() + EXTRA_TEMPLATES)
+def test_format_matches_reference(template):
+    for user_set, target_set in itertools.product(PronounSet, repeat=2):
+        participants = {
+            "user": LanguageProfile("Bob", user_set, "<b>%s</b>"),
+            "target": LanguageProfile("claire's dog", target_set),
+            "guy": LanguageProfile("Guy", user_set),
+            "combatant": LanguageProfile("Rat", target_set),
+        }
+        assert language.format(template, **participants) == reference_format(template, **participants)
+
+@pytest.mark.parametrize("template, user_set, expected", [
+    ("{User} {user.swings} at {Target}", PronounSet.SHE, "Bob swings at Rat"),
+    ("{User} {user.swings} at {Target}", PronounSet.YOU, "Bob swing at Rat"),
+    ("{Target} {target.is} too fast for {User}!", PronounSet.HE, "Rat is too fast for Bob!"),
+    ("{User} {user.bashes} {user.his} head", PronounSet.THEY, "Bob bash their head"),
+    ("{User's} slash", PronounSet.HE, "Bob's slash"),
+    ("{User's} slash", PronounSet.YOU, "Your slash"),
+    ("{USER.he} {user.tries}", PronounSet.IT, "IT tries"),
+    ("{User.he} {user.tries}", PronounSet.YOU, "You try"),
+])
+def test_format_table(template, user_set, expected):
+    participants = {
+        "user": LanguageProfile("Bob", user_set),
+        "target": LanguageProfile("Rat", PronounSet.IT),
+    }
+    assert language.format(template, **participants) == expected
@@ -0,0 +1,37 @@
+import time
+import asyncio
+
+from ui.pacing import FramePacer
+from ui.profiler import FrameProfiler
+
+def test_stalls_while_pacing_count_as_coroutines():
+    pacer = FramePacer()
+    profiler = FrameProfiler(idle_clock=lambda: pacer.selector.waited)
+
+    async def stall() -> None:
+        # Wakes up while the pacer's sleeping off a frame and hogs the loop
+        await asyncio.sleep(0.001)
+        time.sleep(0.05)
+
+    async def frames() -> None:
+        task = asyncio.create_task(stall())
+        for _ in range(3):
+            profiler.begin_frame()
+            profiler.mark("process")
+            pacer.frame_drawn()
+            await asyncio.sleep(0)
+            profiler.mark("coroutines")
+            profiler.end_frame()
+            await pacer.pace()
+        await task
+
+    loop = asyncio.SelectorEventLoop(pacer.selector)
+    try:
+        loop.run_until_complete(frames())
+    finally:
+        loop.close()
+
+    assert max(profiler.samples["coroutines"]) >= 0.045
+
+    # And sleeping isn't counted as anything
+    assert sum(profiler.totals) < 0.1
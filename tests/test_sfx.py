@@ -0,0 +1,56 @@
+import pyray as rl
+import pytest
+
+from game import sfx
+
+@pytest.fixture
+def audio(monkeypatch):
+    # The headless backend has no audio, but raylib's null device is enough
+    # to load and "play" sounds
+    rl.set_trace_log_level(rl.TraceLogLevel.LOG_WARNING)
+    rl.init_audio_device()
+    if not rl.is_audio_device_ready():
+        pytest.skip("No audio device")
+
+    monkeypatch.setattr(sfx, "audio", True)
+    yield
+
+    for name in list(sfx.cached_sounds):
+        for alias in sfx._voice_pools.pop(name, [])[1:]:
+            rl.unload_sound_alias(alias)
+        rl.unload_sound(sfx.cached_sounds.pop(name))
+    sfx.cached_bytes = 0
+    sfx._playing.clear()
+    rl.close_audio_device()
+
+def test_evicting_forgets_finished_voices(audio, monkeypatch):
+    # Anything past the first sound is over budget
+    monkeypatch.setattr(sfx, "SOUND_BUDGET_BYTES", 1)
+
+    entry = sfx._play("item")
+    assert entry
+
+    # Finished, but nothing's pruned it yet
+    rl.stop_sound(entry[0])
+    assert sfx._playing == [entry]
+
+    # Loading this one evicts "item" out from under that entry
+    sfx.get_sound("walk_wood")
+    assert "item" not in sfx.cached_sounds
+    assert all(name != "item" for _, name, _, _ in sfx._playing)
+
+    # And playing more never looks at the freed voice
+    assert sfx._play("intro")
+    assert [name for _, name, _, _ in sfx._playing] == ["intro"]
+
+def test_music_thread_survives_bad_commands():
+    thread = sfx.MusicThread()
+    thread.start()
+
+    thread.commands.put(("nonsense",))
+    thread.commands.put(("volume", 0.5))
+    thread.commands.put(("quit",))
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert thread.master_volume == 0.5
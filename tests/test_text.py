@@ -0,0 +1,24 @@
+import pyray as rl
+
+from ui import style
+from ui.backend import Backend
+from ui.renderable import Renderable
+from ui.text import TextRenderable
+from ui.vector2 import Vector2
+
+Renderable.font, Renderable.glyph_metrics = Backend.current.load_font("static/unscii-16.ttf", 16)
+Renderable.font_size = 16
+
+def test_recoloring_a_style_unbakes():
+    tag = "test_recolor"
+    style.register(rl.RED, tag)
+
+    text = TextRenderable(f"<{tag}>hello</{tag}>")
+    text.reflow_layout(Vector2(400, 100))
+    for _ in range(TextRenderable.BAKE_AFTER_FRAMES):
+        text.render(Vector2.zero())
+    assert text.baked
+
+    style.register(rl.BLUE, tag)
+    text.render(Vector2.zero())
+    assert not text.baked
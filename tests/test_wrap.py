@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+from etc.font import GlyphAtlas, GlyphMetrics
+from ui.renderable import Renderable
+from ui.text import RichText, RichTextChunk, TextRenderable
+from ui.vector2 import Vector2
+
+FONT_SIZE = 16
+ALPHABET = "abcd   \n"
+
+# Different widths so breaks don't all land on the same columns
+ADVANCES = {ord("a"): 6.0, ord("b"): 8.0, ord("c"): 11.0, ord("d"): 16.0, ord(" "): 5.0}
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = GlyphMetrics(FONT_SIZE, ADVANCES, 8.0)
+    monkeypatch.setattr(Renderable, "glyph_metrics", metrics, raising=False)
+    monkeypatch.setattr(Renderable, "font", GlyphAtlas(None, metrics), raising=False)
+    monkeypatch.setattr(Renderable, "font_size", FONT_SIZE, raising=False)
+    return metrics
+
+def reference_breaks(raw: str, max_line_width: float) -> list[int]:
+    # The original wrap, rerun over the whole string every time
+    breaks = []
+    last_space_index = -1
+    line_width = 0.0
+    current_word_width = 0.0
+
+    for i, char in enumerate(raw):
+        if char == "\n":
+            line_width = 0.0
+            current_word_width = 0.0
+            last_space_index = -1
+            continue
+
+        char_width = ADVANCES.get(ord(char), 8.0)
+        line_width += char_width
+        current_word_width += char_width
+
+        if char == " ":
+            last_space_index = i
+            current_word_width = 0.0
+
+        if line_width > max_line_width:
+            if last_space_index != -1:
+                breaks.append(last_space_index)
+                line_width = current_word_width
+            else:
+                breaks.append(i)
+                line_width = 0.0
+                current_word_width = 0.0
+            last_space_index = -1
+    return breaks
+
+def reference_glyphs(text: RichText, breaks: list[int]) -> list[tuple]:
+    # (char, style, line, x) for every character that gets drawn, laid out
+    # the original way: a "\n" after every break, then split into lines
+    glyphs = []
+    line = 0
+    x = 0.0
+    i = 0
+    for chunk in text.nodes:
+        for char in chunk.text:
+            if char == "\n":
+                line += 1
+                x = 0.0
+            else:
+                glyphs.append((char, chunk.style, line, x))
+                x += ADVANCES.get(ord(char), 8.0)
+
+            if i in breaks:
+                line += 1
+                x = 0.0
+            i += 1
+    return glyphs
+
+def drawn_glyphs(renderable: TextRenderable) -> list[tuple]:
+    glyphs = []
+    for style_id, line, seg_x, runs in renderable.segments:
+        for _, run, run_x in runs:
+            x = seg_x + run_x
+            for char in run:
+                glyphs.append((char, style_id, line, x))
+                x += ADVANCES.get(ord(char), 8.0)
+    return glyphs
+
+def check(renderable: TextRenderable, metrics: GlyphMetrics, width: float) -> None:
+    text = renderable.text
+    raw = text.get_raw()
+    breaks = reference_breaks(raw, width - 24.0)
+
+    assert renderable.inserted_break_indices == breaks
+    # Every advance is a whole number, so positions come out exact
+    assert drawn_glyphs(renderable) == reference_glyphs(text, breaks)
+
+    wrapped = "".join(
+        char + ("\n" if i in breaks else "")
+        for i, char in enumerate(raw)
+    )
+    measured = renderable.measure()
+    assert (measured.x, measured.y) == metrics.measure(wrapped, FONT_SIZE)
+
+def random_text(rng: random.Random) -> RichText:
+    # Few styles, so neighbouring chunks often share one and get merged
+    return RichText([
+        RichTextChunk(
+            "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40))),
+            style=rng.randint(0, 2)
+        )
+        for _ in range(rng.randint(1, 6))
+    ])
+
+def test_typewriter_wrap_matches_full_wrap(metrics):
+    rng = random.Random(1313)
+
+    for _ in range(3000):
+        text = random_text(rng)
+        width = Vector2(rng.randint(30, 240), 100)
+
+        renderable = TextRenderable("")
+        renderable.reflow_layout(width)
+
+        # A few characters at a time, like the drip feed
+        shown = 0
+        while shown < len(text):
+            shown = min(len(text), shown + rng.randint(1, 5))
+            renderable.text = text.get_n_leading(shown)
+            renderable.reflow_layout(width)
+            check(renderable, metrics, width.x)
+
+        # Then the window gets resized
+        width = Vector2(rng.randint(30, 240), 100)
+        renderable.reflow_layout(width)
+        check(renderable, metrics, width.x)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+# Tweens: slide any numeric attribute of anything from where it is to where
+# you want it over some number of seconds. Goes by the backend clock, so a fade
+# takes the same time at 30 FPS as at 144 (and headless runs stay in lockstep
+# with their virtual time). Await a tween to wait for it to finish.
+
+import math
+import asyncio
+from typing import Any, Callable
+
+from ui.backend import Backend
+from ui.pacing import pacer
+
+# t goes 0 -> 1, so should whatever these return
+
+def linear(t: float) -> float:
+    return t
+
+def ease_in(t: float) -> float:
+    return t * t
+
+def ease_out(t: float) -> float:
+    return 1 - (1 - t) * (1 - t)
+
+def ease_in_out(t: float) -> float:
+    return (1 - math.cos(math.pi * t)) / 2
+
+class Tween:
+    def __init__(
+        self,
+        target: Any,
+        attr: str,
+        end: float,
+        duration: float,
+        easing: Callable[[float], float] = linear,
+    ) -> None:
+        self.target = target
+        self.attr = attr
+        self.start = getattr(target, attr)
+        self.end = end
+        self.duration = duration
+        self.easing = easing
+        self.started_at = Backend.current.get_time()
+
+        loop = asyncio.get_running_loop()
+        self.future = loop.create_future()
+
+    def __await__(self):
+        return self.future.__await__()
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    def step(self, now: float) -> None:
+        if self.duration <= 0:
+            progress = 1.0
+        else:
+            progress = min(1.0, (now - self.started_at) / self.duration)
+
+        value = self.start + (self.end - self.start) * self.easing(progress)
+        setattr(self.target, self.attr, value)
+
+        if progress >= 1.0:
+            self.finish()
+
+    def finish(self) -> None:
+        # Also used when something else takes over our attribute. Whoever's
+        # waiting on us gets to move on either way
+        if not self.future.done():
+            self.future.set_result(None)
+
+class Animator:
+    def __init__(self) -> None:
+        # (id(target), attr) -> tween. One tween per attribute; a new one
+        # takes over from wherever the old one got to
+        self.tweens: dict[tuple[int, str], Tween] = {}
+
+    def tween(
+        self,
+        target: Any,
+        attr: str,
+        end: float,
+        duration: float,
+        easing: Callable[[float], float] = linear,
+    ) -> Tween:
+        key = (id(target), attr)
+        old = self.tweens.get(key)
+        if old:
+            old.finish()
+
+        tween = self.tweens[key] = Tween(target, attr, end, duration, easing)
+        pacer.request_redraw()
+        return tween
+
+    def cancel(self, target: Any, attr: str) -> None:
+        tween = self.tweens.pop((id(target), attr), None)
+        if tween:
+            tween.finish()
+
+    def is_animating(self) -> bool:
+        return bool(self.tweens)
+
+    def step(self) -> None:
+        # Once per frame, before layout
+        if not self.tweens:
+            return
+
+        now = Backend.current.get_time()
+        for key, tween in list(self.tweens.items()):
+            tween.step(now)
+            if tween.done:
+                del self.tweens[key]
+
+animator = Animator()
+pacer.add_activity_check(animator.is_animating)
@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+# Everything that talks to the window, GPU or keyboard goes through here, so
+# the engine can run without any of those (load tests, hosted sessions,
+# benchmarks). Method names mirror pyray's so swapping a call over is just
+# rl.thing(...) -> Backend.current.thing(...).
+#
+# CPU-only raylib stuff (rl.load_image, rl.image_resize, colors, etc) doesn't
+# need a window and is still called directly.
+
+import time
+import asyncio
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pyray as rl
+
+from etc import font
+from etc.font import GlyphAtlas, GlyphMetrics
+from ui.pacing import pacer
+
+class Backend:
+    # Set by main.py before anything is drawn
+    current: Backend
+
+    audio_ready = False
+
+    def init_window(self, width: int, height: int, title: str) -> None:
+        raise NotImplementedError
+
+    def init_audio_device(self) -> None:
+        raise NotImplementedError
+
+    def window_should_close(self) -> bool:
+        raise NotImplementedError
+
+    def close_window(self) -> None:
+        raise NotImplementedError
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        return asyncio.SelectorEventLoop(pacer.selector)
+
+    def run_in_background(self, func: Callable[..., Any], *args: Any) -> asyncio.Future:
+        # Slow CPU-side work (decoding, blurring) that shouldn't hold up frames
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def get_time(self) -> float:
+        # Seconds on a monotonic clock
+        raise NotImplementedError
+
+    def get_render_width(self) -> int:
+        raise NotImplementedError
+
+    def get_render_height(self) -> int:
+        raise NotImplementedError
+
+    def get_screen_height(self) -> int:
+        raise NotImplementedError
+
+    def toggle_borderless_windowed(self) -> None:
+        pass
+
+    # Input
+
+    def is_key_pressed(self, key: int) -> bool:
+        raise NotImplementedError
+
+    def is_key_pressed_repeat(self, key: int) -> bool:
+        raise NotImplementedError
+
+    def get_char_pressed(self) -> int:
+        raise NotImplementedError
+
+    def is_key_down(self, key: int) -> bool:
+        raise NotImplementedError
+
+    def poll_input_events(self) -> None:
+        # For frames we don't draw. end_drawing does this otherwise
+        pass
+
+    def has_input_events(self) -> bool:
+        # Anything happen since the last poll worth drawing a frame for?
+        return False
+
+    def is_any_key_down(self) -> bool:
+        return False
+
+    # Fonts and textures
+
+    def load_font(self, file_name: str, font_size: int, cache_dir: Optional[Path] = None) -> tuple[GlyphAtlas, GlyphMetrics]:
+        raise NotImplementedError
+
+    def load_texture_from_image(self, image: rl.Image) -> Any:
+        raise NotImplementedError
+
+    def unload_texture(self, texture: Any) -> None:
+        raise NotImplementedError
+
+    def load_render_texture(self, width: int, height: int) -> Any:
+        raise NotImplementedError
+
+    def unload_render_texture(self, target: Any) -> None:
+        raise NotImplementedError
+
+    # Drawing
+
+    def begin_drawing(self) -> None:
+        raise NotImplementedError
+
+    def end_drawing(self) -> None:
+        raise NotImplementedError
+
+    def begin_texture_mode(self, target: Any) -> None:
+        raise NotImplementedError
+
+    def end_texture_mode(self) -> None:
+        raise NotImplementedError
+
+    def begin_blend_mode(self, mode: int) -> None:
+        raise NotImplementedError
+
+    def end_blend_mode(self) -> None:
+        raise NotImplementedError
+
+    def rl_set_blend_factors_separate(self, src_rgb: int, dst_rgb: int, src_alpha: int, dst_alpha: int, eq_rgb: int, eq_alpha: int) -> None:
+        # For BLEND_CUSTOM_SEPARATE
+        raise NotImplementedError
+
+    def clear_background(self, color: rl.Color) -> None:
+        raise NotImplementedError
+
+    def draw_text_ex(self, font: Any, text: str, position: rl.Vector2, font_size: float, spacing: float, tint: rl.Color) -> None:
+        raise NotImplementedError
+
+    def draw_texture_ex(self, texture: Any, position: rl.Vector2, rotation: float, scale: float, tint: rl.Color) -> None:
+        raise NotImplementedError
+
+    def draw_texture_rec(self, texture: Any, source: rl.Rectangle, position: rl.Vector2, tint: rl.Color) -> None:
+        raise NotImplementedError
+
+    def draw_rectangle_v(self, position: rl.Vector2, size: rl.Vector2, color: rl.Color) -> None:
+        raise NotImplementedError
+
+class RaylibBackend(Backend):
+    def __init__(self) -> None:
+        # Chars we've taken out of raylib's queue (see has_input_events) and
+        # nobody's read yet
+        self._chars: deque[int] = deque()
+
+        # Keys that went down and (as far as we've checked) haven't come up
+        self._held: set[int] = set()
+
+    def init_window(self, width: int, height: int, title: str) -> None:
+        rl.set_trace_log_level(rl.TraceLogLevel.LOG_WARNING)
+        rl.set_window_state(rl.ConfigFlags.FLAG_WINDOW_RESIZABLE | rl.ConfigFlags.FLAG_WINDOW_HIGHDPI)
+        rl.init_window(width, height, title)
+        # No target FPS: ui.pacing decides when (and whether) to draw, and
+        # raylib's own wait would block the event loop on top of that
+
+    def init_audio_device(self) -> None:
+        rl.init_audio_device()
+        self.audio_ready = rl.is_audio_device_ready()
+
+    def window_should_close(self) -> bool:
+        return rl.window_should_close()
+
+    def close_window(self) -> None:
+        rl.close_window()
+
+    def get_time(self) -> float:
+        return time.monotonic()
+
+    def get_render_width(self) -> int:
+        return rl.get_render_width()
+
+    def get_render_height(self) -> int:
+        return rl.get_render_height()
+
+    def get_screen_height(self) -> int:
+        return rl.get_screen_height()
+
+    def toggle_borderless_windowed(self) -> None:
+        rl.toggle_borderless_windowed()
+
+    def is_key_pressed(self, key: int) -> bool:
+        return rl.is_key_pressed(key)
+
+    def is_key_pressed_repeat(self, key: int) -> bool:
+        return rl.is_key_pressed_repeat(key)
+
+    def get_char_pressed(self) -> int:
+        if self._chars:
+            return self._chars.popleft()
+        return rl.get_char_pressed()
+
+    def is_key_down(self, key: int) -> bool:
+        return rl.is_key_down(key)
+
+    def poll_input_events(self) -> None:
+        rl.poll_input_events()
+
+    def has_input_events(self) -> bool:
+        # The pressed key queue is separate from the char queue and key state
+        # the input box reads, so draining it here doesn't eat anything
+        pressed = False
+        while key := rl.get_key_pressed():
+            self._held.add(key)
+            pressed = True
+
+        # Holding a key down only repeats into the char queue, never the
+        # pressed key queue. Hang on to the chars until a frame reads them
+        while char := rl.get_char_pressed():
+            self._chars.append(char)
+
+        return pressed or bool(self._chars) or rl.is_window_resized()
+
+    def is_any_key_down(self) -> bool:
+        self._held = {key for key in self._held if rl.is_key_down(key)}
+        return bool(self._held)
+
+    def load_font(self, file_name: str, font_size: int, cache_dir: Optional[Path] = None) -> tuple[GlyphAtlas, GlyphMetrics]:
+        atlas = font.load_atlas(file_name, font_size, cache_dir)
+        return atlas, atlas.metrics
+
+    def load_texture_from_image(self, image: rl.Image) -> rl.Texture:
+        return rl.load_texture_from_image(image)
+
+    def unload_texture(self, texture: rl.Texture) -> None:
+        rl.unload_texture(texture)
+
+    def load_render_texture(self, width: int, height: int) -> rl.RenderTexture:
+        return rl.load_render_texture(width, height)
+
+    def unload_render_texture(self, target: rl.RenderTexture) -> None:
+        rl.unload_render_texture(target)
+
+    def begin_drawing(self) -> None:
+        rl.begin_drawing()
+
+    def end_drawing(self) -> None:
+        # That frame had its chance to read these. raylib drops its own
+        # unread ones when it polls, so we do too
+        self._chars.clear()
+        rl.end_drawing()
+
+    def begin_texture_mode(self, target: rl.RenderTexture) -> None:
+        rl.begin_texture_mode(target)
+
+    def end_texture_mode(self) -> None:
+        rl.end_texture_mode()
+
+    def begin_blend_mode(self, mode: int) -> None:
+        rl.begin_blend_mode(mode)
+
+    def end_blend_mode(self) -> None:
+        rl.end_blend_mode()
+
+    def rl_set_blend_factors_separate(self, src_rgb: int, dst_rgb: int, src_alpha: int, dst_alpha: int, eq_rgb: int, eq_alpha: int) -> None:
+        rl.rl_set_blend_factors_separate(src_rgb, dst_rgb, src_alpha, dst_alpha, eq_rgb, eq_alpha)
+
+    def clear_background(self, color: rl.Color) -> None:
+        rl.clear_background(color)
+
+    def draw_text_ex(self, font: rl.Font, text: str, position: rl.Vector2, font_size: float, spacing: float, tint: rl.Color) -> None:
+        rl.draw_text_ex(font, text, position, font_size, spacing, tint)
+
+    def draw_texture_ex(self, texture: rl.Texture, position: rl.Vector2, rotation: float, scale: float, tint: rl.Color) -> None:
+        rl.draw_texture_ex(texture, position, rotation, scale, tint)
+
+    def draw_texture_rec(self, texture: rl.Texture, source: rl.Rectangle, position: rl.Vector2, tint: rl.Color) -> None:
+        rl.draw_texture_rec(texture, source, position, tint)
+
+    def draw_rectangle_v(self, position: rl.Vector2, size: rl.Vector2, color: rl.Color) -> None:
+        rl.draw_rectangle_v(position, size, color)
+
+class HeadlessTexture:
+    # Stands in for rl.Texture. Layout only ever looks at the size
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+
+class HeadlessRenderTexture:
+    def __init__(self, width: int, height: int) -> None:
+        self.texture = HeadlessTexture(width, height)
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    # asyncio.sleep and friends go by loop.time(), so pointing that at the
+    # backend's frame clock makes every sleep in the game last a fixed number
+    # of frames instead of real seconds
+    def __init__(self, clock: Callable[[], float]) -> None:
+        super().__init__(pacer.selector)
+        self._clock = clock
+
+    def time(self) -> float:
+        return self._clock()
+
+class HeadlessBackend(Backend):
+    # No window, no GPU, no audio. Drawing does nothing, every glyph is the
+    # same width, time moves forward one 60 FPS frame per frame (as fast as
+    # we can go), and input comes from a script of lines to "type"
+
+    FRAME_TIME = 1 / 60
+
+    def __init__(self, script: Optional[list[str]] = None) -> None:
+        self.script = deque(script or [])
+
+        # Lines are only typed once this says the game is waiting for one.
+        # Otherwise an early enter gets eaten skipping a typewriter line
+        self.input_wanted: Callable[[], bool] = lambda: True
+
+        self.width = 0
+        self.height = 0
+        self.frames = 0
+        self.clock = 0.0
+        self._started_at = time.monotonic()
+
+        self._pressed_keys: set[int] = set()
+        self._chars: deque[int] = deque()
+        self._enter_next_frame = False
+
+    def init_window(self, width: int, height: int, title: str) -> None:
+        # CPU-side raylib (image loading) still logs
+        rl.set_trace_log_level(rl.TraceLogLevel.LOG_WARNING)
+
+        self.width = width
+        self.height = height
+        print(f"[headless] '{title}' at {width}x{height}, {len(self.script)} scripted lines")
+
+    def init_audio_device(self) -> None:
+        self.audio_ready = False
+
+    def window_should_close(self) -> bool:
+        # Nothing left to type and the game's waiting on us: we're done
+        return not self.script and not self._enter_next_frame and self.input_wanted()
+
+    def close_window(self) -> None:
+        elapsed = time.monotonic() - self._started_at
+        print(f"[headless] {self.frames} frames ({self.clock:.1f}s game time) in {elapsed:.2f}s")
+
+    def new_event_loop(self) -> asyncio.AbstractEventLoop:
+        return VirtualTimeEventLoop(self.get_time)
+
+    def run_in_background(self, func: Callable[..., Any], *args: Any) -> asyncio.Future:
+        # Right here, right now. On a thread, however long it took in real
+        # time would turn into some number of frames of game time, and no two
+        # runs would take the same number of frames
+        future = asyncio.get_running_loop().create_future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def get_time(self) -> float:
+        return self.clock
+
+    def get_render_width(self) -> int:
+        return self.width
+
+    def get_render_height(self) -> int:
+        return self.height
+
+    def get_screen_height(self) -> int:
+        return self.height
+
+    def poll_input(self) -> None:
+        self._pressed_keys.clear()
+        self._chars.clear()
+
+        # Type a line one frame, press enter the next, same as a person would
+        if self._enter_next_frame:
+            self._pressed_keys.add(rl.KEY_ENTER)
+            self._enter_next_frame = False
+        elif self.script and self.input_wanted():
+            line = self.script.popleft()
+            print(f"[headless] > {line}")
+            self._chars.extend(ord(c) for c in line)
+            self._enter_next_frame = True
+
+    def is_key_pressed(self, key: int) -> bool:
+        return key in self._pressed_keys
+
+    def is_key_pressed_repeat(self, key: int) -> bool:
+        return False
+
+    def get_char_pressed(self) -> int:
+        return self._chars.popleft() if self._chars else 0
+
+    def is_key_down(self, key: int) -> bool:
+        return key in self._pressed_keys
+
+    def is_any_key_down(self) -> bool:
+        return bool(self._pressed_keys)
+
+    def load_font(self, file_name: str, font_size: int, cache_dir: Optional[Path] = None) -> tuple[GlyphAtlas, GlyphMetrics]:
+        # Half as wide as it is tall, like unscii. No TTF behind it, so
+        # everything just goes to the (nonexistent) base page
+        metrics = GlyphMetrics(font_size, {}, font_size / 2)
+        return GlyphAtlas(None, metrics), metrics
+
+    def load_texture_from_image(self, image: rl.Image) -> HeadlessTexture:
+        return HeadlessTexture(image.width, image.height)
+
+    def unload_texture(self, texture: HeadlessTexture) -> None:
+        pass
+
+    def load_render_texture(self, width: int, height: int) -> HeadlessRenderTexture:
+        return HeadlessRenderTexture(width, height)
+
+    def unload_render_texture(self, target: HeadlessRenderTexture) -> None:
+        pass
+
+    def begin_drawing(self) -> None:
+        pass
+
+    def end_drawing(self) -> None:
+        # raylib polls input at the end of the frame too
+        self.frames += 1
+        self.clock += self.FRAME_TIME
+        self.poll_input()
+
+    def begin_texture_mode(self, target: HeadlessRenderTexture) -> None:
+        pass
+
+    def end_texture_mode(self) -> None:
+        pass
+
+    def begin_blend_mode(self, mode: int) -> None:
+        pass
+
+    def end_blend_mode(self) -> None:
+        pass
+
+    def rl_set_blend_factors_separate(self, src_rgb: int, dst_rgb: int, src_alpha: int, dst_alpha: int, eq_rgb: int, eq_alpha: int) -> None:
+        pass
+
+    def clear_background(self, color: rl.Color) -> None:
+        pass
+
+    def draw_text_ex(self, font: Any, text: str, position: rl.Vector2, font_size: float, spacing: float, tint: rl.Color) -> None:
+        pass
+
+    def draw_texture_ex(self, texture: HeadlessTexture, position: rl.Vector2, rotation: float, scale: float, tint: rl.Color) -> None:
+        pass
+
+    def draw_texture_rec(self, texture: HeadlessTexture, source: rl.Rectangle, position: rl.Vector2, tint: rl.Color) -> None:
+        pass
+
+    def draw_rectangle_v(self, position: rl.Vector2, size: rl.Vector2, color: rl.Color) -> None:
+        pass
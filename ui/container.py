@@ -1,6 +1,9 @@
 from enum import Enum
+from collections import deque
+
 from ui.vector2 import Vector2
 from ui.renderable import Renderable
+from ui.text import RichText, TextRenderable
 
 class VAlign(Enum):
     TOP = 0
@@ -19,15 +22,25 @@ class Container(Renderable):
         self.padding = kwargs.pop("padding", Vector2.zero())
         self.gap = kwargs.pop("gap", 2)
         self._cached_reflow_size = Vector2.zero()
+
+        # Scratch vectors so layout and rendering don't allocate. Children
+        # copy what they're allocated, so one can be shared between them
+        self._content_size = Vector2.zero()
+        self._child_allocation = Vector2.zero()
+        self._padded_position = Vector2.zero()
+
         super().__init__(**kwargs)
 
     def render(self, position) -> None:
-        super().render(position + self.padding / 2)
+        super().render(self._padded_position.set(
+            position.x + self.padding.x / 2,
+            position.y + self.padding.y / 2,
+        ))
 
     def render_self(self, position: Vector2) -> None:
         pass
 
-    def reflow_layout(self, allocated_size: Vector2) -> None:
+    def reflow_layout_children(self, allocated_size: Vector2) -> None:
         raise NotImplementedError
 
     def measure(self) -> Vector2:
@@ -35,93 +48,84 @@ class Container(Renderable):
         return (self.static_size or self._cached_reflow_size) + self.padding
 
 class VStackContainer(Container):
-    def reflow_layout(self, allocated_size: Vector2) -> None:
-        self._cached_reflow_size = allocated_size
-
-        content_size = allocated_size - self.padding
-        wiggle_room = content_size.y - (self.gap * (len(self.active_children) - 1))
-        dynamic_children = len(self.active_children)
+    def reflow_layout_children(self, allocated_size: Vector2) -> None:
+        content_size = self._content_size.set_from(allocated_size).isub(self.padding)
+        children = self.active_children
+
+        # Static children get what they ask for, the rest split what's left
+        wiggle_room = content_size.y - (self.gap * (len(children) - 1))
+        dynamic_children = len(children)
+        for child in children:
+            if child.static_size:
+                wiggle_room -= child.static_size.y
+                dynamic_children -= 1
+        dynamic_height = wiggle_room / dynamic_children if dynamic_children else 0
 
-        for child in self.active_children:
-            if not child.static_size:
-                continue
+        assert self.v_align != VAlign.CENTER
+        from_bottom = self.v_align == VAlign.BOTTOM
 
-            wiggle_room -= child.static_size.y
-            child.reflow_layout(Vector2(content_size.x, child.static_size.y))
-            dynamic_children -= 1
+        pos_y = content_size.y if from_bottom else 0
+        max_width = 0
+        allocation = self._child_allocation
 
-        for child in self.active_children:
+        # Allocate, lay out, measure and place in one go
+        for child in reversed(children) if from_bottom else children:
             if child.static_size:
-                continue
-            child.reflow_layout(Vector2(
-                content_size.x,
-                wiggle_room / dynamic_children
-            ))
+                allocation.set(content_size.x, child.static_size.y)
+            else:
+                allocation.set(content_size.x, dynamic_height)
+            child.reflow_layout(allocation)
 
-        max_width = 0
-        for child in self.active_children:
-            child_size = child.measure()
+            child_size = child.measured()
             if child_size.x > max_width:
                 max_width = child_size.x
-        self._cached_reflow_size = Vector2(max_width, allocated_size.y)
-
-        assert self.v_align != VAlign.CENTER
-
-        pos_y = 0
-        iterator = self.active_children
-
-        if self.v_align == VAlign.BOTTOM:
-            pos_y = content_size.y
-            iterator = reversed(iterator)
-
-        for child in iterator:
-            child_size = child.measure()
 
             child.position.x = 0
 
-            if self.v_align == VAlign.BOTTOM:
+            if from_bottom:
                 pos_y -= child_size.y + self.gap
                 child.position.y = pos_y
             else:
                 child.position.y = pos_y
                 pos_y += child_size.y + self.gap
 
-class HStackContainer(Container):
-    def reflow_layout(self, allocated_size: Vector2) -> None:
-        self._cached_reflow_size = allocated_size
+        self._cached_reflow_size.set(max_width, allocated_size.y)
 
-        content_size = allocated_size - self.padding
-        wiggle_room = content_size.x - (self.gap * (len(self.active_children) - 1))
-        dynamic_children = len(self.active_children)
-
-        for child in self.active_children:
-            if not child.static_size:
-                continue
-
-            wiggle_room -= child.static_size.x
-            child.reflow_layout(Vector2(content_size.x, child.static_size.y))
-            dynamic_children -= 1
+class HStackContainer(Container):
+    def reflow_layout_children(self, allocated_size: Vector2) -> None:
+        content_size = self._content_size.set_from(allocated_size).isub(self.padding)
+        children = self.active_children
 
-        for child in self.active_children:
+        wiggle_room = content_size.x - (self.gap * (len(children) - 1))
+        dynamic_children = len(children)
+        for child in children:
             if child.static_size:
-                continue
-            child.reflow_layout(Vector2(
-                wiggle_room / dynamic_children,
-                content_size.y,
-            ))
+                wiggle_room -= child.static_size.x
+                dynamic_children -= 1
+        dynamic_width = wiggle_room / dynamic_children if dynamic_children else 0
 
         max_height = 0
         children_width = 0
-        for child in self.active_children:
-            child_size = child.measure()
-            children_width += child_size.x
+        allocation = self._child_allocation
 
+        for child in children:
+            if child.static_size:
+                allocation.set(content_size.x, child.static_size.y)
+            else:
+                allocation.set(dynamic_width, content_size.y)
+            child.reflow_layout(allocation)
+
+            child_size = child.measured()
+            children_width += child_size.x
             if child_size.y > max_height:
                 max_height = child_size.y
-        self._cached_reflow_size = Vector2(allocated_size.x, max_height)
 
+        self._cached_reflow_size.set(allocated_size.x, max_height)
+
+        # Centering needs the total width first, so placing is a second (cheap)
+        # walk over the cached sizes
         pos_x = 0
-        iterator = self.active_children
+        iterator = children
 
         if self.h_align == HAlign.RIGHT:
             pos_x = content_size.x
@@ -130,7 +134,7 @@ class HStackContainer(Container):
             pos_x = (content_size.x - children_width) / 2
 
         for child in iterator:
-            child_size = child.measure()
+            child_size = child.measured()
 
             child.position.y = 0
 
@@ -140,3 +144,79 @@ class HStackContainer(Container):
             else:
                 child.position.x = pos_x
                 pos_x += child_size.x + self.gap
+
+class LogContainer(VStackContainer):
+    # Bottom-up log. Once a line scrolls off the top it's turned back into
+    # plain RichText in a bounded history and its renderable is dropped. If
+    # the window grows again, lines come back out of the history to fill the
+    # top back in. Only what's on screen (capped at max_live) stays in the
+    # tree, so long sessions don't get slower or bigger.
+
+    def __init__(self, **kwargs) -> None:
+        self.max_live = kwargs.pop("max_live", 200)
+
+        # Most recently dropped (the line just above the top) last
+        self.history: deque[RichText] = deque(maxlen=kwargs.pop("history_size", 2000))
+
+        kwargs.setdefault("v_align", VAlign.BOTTOM)
+        super().__init__(**kwargs)
+
+        assert self.v_align == VAlign.BOTTOM
+
+    def archive(self, node: Renderable) -> None:
+        # Only text can be rebuilt. Anything else (a portrait next to some
+        # dialog) is just gone, but its text comes back on its own
+        if isinstance(node, TextRenderable):
+            self.history.append(node.text)
+
+        for child in node._children:
+            self.archive(child)
+
+    def clear_children(self) -> None:
+        # Cleared on purpose, so it had better not come back
+        self.history.clear()
+        super().clear_children()
+
+    def space_above(self) -> float:
+        # How far down the top line starts (everything, if there isn't one)
+        if not self._children:
+            return self._content_size.y
+        return self._children[0].position.y - self.gap
+
+    def reflow_layout_children(self, allocated_size: Vector2) -> None:
+        super().reflow_layout_children(allocated_size)
+
+        # Room at the top (we got taller)? Bring back lines we dropped, one
+        # at a time since we don't know how tall one is until it's wrapped
+        restored = False
+        while self.history and self.space_above() > 0 and len(self._children) < self.max_live:
+            line = TextRenderable(self.history.pop())
+            line.parent = self
+            self._children.insert(0, line)
+            self.refresh_active_children()
+
+            # Only the new line actually gets laid out, the rest are clean
+            super().reflow_layout_children(allocated_size)
+            restored = True
+
+        # Oldest first. Stop at the first line that's still (partly) visible
+        hidden = 0
+        for child in self._children:
+            over_budget = len(self._children) - hidden > self.max_live
+            if not over_budget and child.position.y + child.measured().y > 0:
+                break
+            hidden += 1
+
+        for child in self._children[:hidden]:
+            self.archive(child)
+            child.parent = None
+            child.free()
+        del self._children[:hidden]
+
+        if hidden:
+            self.refresh_active_children()
+
+        if hidden or restored:
+            # Everything else keeps its position (we're bottom-aligned), but
+            # our width might depend on what came or went
+            self.invalidate_layout()
@@ -1,8 +1,77 @@
+import struct
+import hashlib
+import functools
 import pyray as rl
-from typing import Optional
+from pathlib import Path
+from typing import Callable, Optional
 
+from ui.backend import Backend
 from ui.vector2 import Vector2
 from ui.renderable import Renderable
+from ui.textures import TextureHandle, textures
+
+# Background images get blown up to the render width and blurred, which is
+# slow enough to hitch a frame or three. So it happens on a worker thread, and
+# the result gets written to disk so we only ever do it once per image/size.
+BG_BLUR_RADIUS = 4
+
+# width, height, raylib pixel format
+_CACHE_HEADER = struct.Struct("<iii")
+
+def _background_cache_path(path: str, render_width: int, cache_dir: Path) -> Path:
+    with open(path, "rb") as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    return cache_dir / f"{digest}-{render_width}-{BG_BLUR_RADIUS}.bin"
+
+def _read_cached_image(cache_path: Path) -> Optional[rl.Image]:
+    try:
+        data = cache_path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < _CACHE_HEADER.size:
+        return None
+
+    width, height, pixel_format = _CACHE_HEADER.unpack_from(data)
+    size = rl.get_pixel_data_size(width, height, pixel_format)
+    if len(data) != _CACHE_HEADER.size + size:
+        # Half-written or something (same goes for no header above). Just
+        # redo it
+        return None
+
+    # unload_image frees with raylib's allocator, so the pixels have to live
+    # in memory it handed out
+    pixels = rl.mem_alloc(size)
+    rl.ffi.memmove(pixels, data[_CACHE_HEADER.size:], size)
+    return rl.Image(pixels, width, height, 1, pixel_format)
+
+def _write_cached_image(cache_path: Path, image: rl.Image) -> None:
+    size = rl.get_pixel_data_size(image.width, image.height, image.format)
+    header = _CACHE_HEADER.pack(image.width, image.height, image.format)
+
+    # Write then rename so a crash never leaves a truncated file behind
+    temp_path = cache_path.with_suffix(".tmp")
+    temp_path.write_bytes(header + rl.ffi.buffer(rl.ffi.cast("char *", image.data), size)[:])
+    temp_path.replace(cache_path)
+
+def process_background(path: str, render_width: int, cache_dir: Optional[Path] = None) -> rl.Image:
+    # Runs on a worker thread. CPU-side raylib only, no GPU calls in here!
+    cache_path = None
+    if cache_dir:
+        cache_path = _background_cache_path(path, render_width, cache_dir)
+        image = _read_cached_image(cache_path)
+        if image:
+            return image
+
+    image = rl.load_image(path)
+
+    factor = max(1, render_width // image.width)
+    rl.image_resize(image, image.width * factor, image.height * factor)
+    rl.image_blur_gaussian(image, BG_BLUR_RADIUS)
+
+    if cache_path:
+        _write_cached_image(cache_path, image)
+    return image
 
 class ImageRenderable(Renderable):
     def __init__(
@@ -18,27 +87,82 @@ class ImageRenderable(Renderable):
         self.loaded = False
         self.is_bg_image = is_bg_image
 
+        self.handle: Optional[TextureHandle] = None
+        self.texture = None
+
+        # Bumped on every load/unload so a slow background load that finishes
+        # after a newer one was asked for gets thrown away
+        self._generation = 0
+
         if path:
             self.load(path)
 
+    def texture_key(self, path: str) -> tuple:
+        # Everything that changes the pixels has to be in here
+        if self.is_bg_image:
+            return (path, Backend.current.get_render_width(), BG_BLUR_RADIUS)
+        return (path,)
+
+    def make_image(self, path: str, cache_dir: Optional[Path] = None) -> Callable[[], rl.Image]:
+        if self.is_bg_image:
+            return functools.partial(
+                process_background,
+                path,
+                Backend.current.get_render_width(),
+                cache_dir
+            )
+        return functools.partial(rl.load_image, path)
+
     def load(self, path: str) -> None:
         assert path
+        self.set_handle(textures.acquire(self.texture_key(path), self.make_image(path)))
 
-        if self.loaded:
-            self.loaded = False
-            rl.unload_texture(self.texture)
+    async def load_async(self, path: str, cache_dir: Optional[Path] = None) -> None:
+        # Decode (and for backgrounds, upscale/blur) off the main thread. Only
+        # the upload to the GPU happens here, once it's ready
+        assert path
 
-        image = rl.load_image(path)
+        self._generation += 1
+        generation = self._generation
 
-        if self.is_bg_image:
-            factor = rl.get_render_width() // image.width
-            rl.image_resize(image, image.width * factor, image.height * factor)
-            rl.image_blur_gaussian(image, 4)
+        handle = await textures.acquire_async(
+            self.texture_key(path),
+            self.make_image(path, cache_dir)
+        )
 
-        self.texture = rl.load_texture_from_image(image)
-        rl.unload_image(image)
+        if generation != self._generation:
+            # Somebody wanted something else in the meantime
+            textures.release(handle)
+            return
+
+        self.set_handle(handle)
+
+    def set_handle(self, handle: TextureHandle) -> None:
+        # Takes over the reference
+        self.unload()
+
+        self.handle = handle
+        self.texture = handle.texture
 
         self.loaded = True
+        self.invalidate_layout()
+
+    def unload(self) -> None:
+        # Also cancels any load_async still in flight
+        self._generation += 1
+
+        if not self.loaded:
+            return
+
+        self.loaded = False
+        textures.release(self.handle)
+        self.handle = None
+        self.texture = None
+        self.invalidate_layout()
+
+    def free(self) -> None:
+        super().free()
+        self.unload()
 
     def measure(self) -> Vector2:
         if self.is_bg_image:
@@ -69,7 +193,7 @@ class ImageRenderable(Renderable):
         alpha = 0x66
         tint = rl.Color(alpha, alpha, alpha, 0xFF) if self.is_bg_image else rl.WHITE
 
-        rl.draw_texture_ex(
+        Backend.current.draw_texture_ex(
             self.texture,
             position.to_raylib(),
             0.0,
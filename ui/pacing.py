@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+# Decides when the main loop actually draws. Sitting at a prompt with nothing
+# moving used to redraw at 60 FPS forever and pin a core. Now we only draw at
+# full rate while something is going on (a fade, a typewriter line, music,
+# layout changes, input), and otherwise just poll for input now and then.
+
+import time
+import asyncio
+import selectors
+from typing import Callable, Optional
+
+class WaitTimingSelector(selectors.DefaultSelector):
+    # The event loop only ever blocks in select, so this adds up how long it
+    # spent doing nothing. Everything else while we're asleep or idle is
+    # somebody's coroutine running (the profiler wants to know about those)
+    def __init__(self) -> None:
+        super().__init__()
+        self.waited = 0.0
+
+    def select(self, timeout: Optional[float] = None):
+        started_at = time.perf_counter()
+        try:
+            return super().select(timeout)
+        finally:
+            self.waited += time.perf_counter() - started_at
+
+class FramePacer:
+    ACTIVE_FPS = 60
+
+    # While idle: how often we check for input, and how often we redraw anyway
+    # just in case (window got uncovered, etc)
+    IDLE_POLL_INTERVAL = 1 / 30
+    HEARTBEAT_INTERVAL = 1.0
+
+    def __init__(self) -> None:
+        # Off = draw every loop and never sleep (headless runs)
+        self.enabled = True
+
+        # Anything that returns True here keeps us at full frame rate
+        self.activity_checks: list[Callable[[], bool]] = []
+
+        self._redraw_requested = True
+        self._last_frame_at = 0.0
+        self._frame_waiters: list[asyncio.Future] = []
+        self._wake: Optional[asyncio.Event] = None
+
+        # Backends build their event loops on this
+        self.selector = WaitTimingSelector()
+
+    def add_activity_check(self, check: Callable[[], bool]) -> None:
+        self.activity_checks.append(check)
+
+    def request_redraw(self) -> None:
+        self._redraw_requested = True
+        if self._wake:
+            self._wake.set()
+
+    def is_active(self) -> bool:
+        if self._redraw_requested or self._frame_waiters:
+            return True
+        return any(check() for check in self.activity_checks)
+
+    def should_draw(self) -> bool:
+        if not self.enabled or self.is_active():
+            return True
+        return time.perf_counter() - self._last_frame_at >= self.HEARTBEAT_INTERVAL
+
+    async def next_frame(self) -> None:
+        # For coroutines that want to do something once per frame (and keep
+        # frames coming while they do)
+        future = asyncio.get_running_loop().create_future()
+        self._frame_waiters.append(future)
+        await future
+
+    def frame_drawn(self) -> None:
+        self._redraw_requested = False
+        self._last_frame_at = time.perf_counter()
+
+        waiters = self._frame_waiters
+        self._frame_waiters = []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    async def pace(self) -> None:
+        # After a drawn frame: sleep off whatever's left of it. Game
+        # coroutines get to run in the meantime
+        if not self.enabled:
+            await asyncio.sleep(0)
+            return
+
+        remaining = 1 / self.ACTIVE_FPS - (time.perf_counter() - self._last_frame_at)
+        await asyncio.sleep(max(0.0, remaining))
+
+    async def idle(self) -> None:
+        # Nothing to draw. Wait for a redraw request or the next input poll,
+        # whichever comes first
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        self._wake.clear()
+
+        try:
+            await asyncio.wait_for(self._wake.wait(), self.IDLE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+pacer = FramePacer()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+# Per-frame timing, split up by what the main loop was doing. Toggle the
+# overlay with F3, or pass --profile-csv <file> to main.py to get one row per
+# frame for poking at in a spreadsheet.
+
+import csv
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import pyray as rl
+
+from etc.font import GlyphAtlas
+from ui.text import draw_text
+from ui.vector2 import Vector2
+
+class FrameProfiler:
+    # In the order the main loop runs them. "present" is end_drawing.
+    # "coroutines" is the game's own code: the asyncio.sleep(0) in the frame,
+    # plus whatever ran while the pacer slept or idled since the last frame.
+    # Time the event loop spent actually waiting (idle_clock) isn't counted
+    # anywhere
+    PHASES = ("process", "reflow", "render", "present", "coroutines")
+
+    # Frame time buckets (ms) for the histogram. Last one is open-ended
+    BUCKETS = (1, 2, 4, 8, 16, 33, 66)
+
+    # How often the overlay text is rebuilt. Drawing it is cheap, formatting
+    # it every frame is not
+    OVERLAY_INTERVAL = 0.25
+
+    def __init__(
+        self,
+        history: int = 300,
+        csv_path: Optional[str] = None,
+        idle_clock: Callable[[], float] = lambda: 0.0,
+    ) -> None:
+        self.samples = {phase: deque(maxlen=history) for phase in self.PHASES}
+        self.totals: deque[float] = deque(maxlen=history)
+
+        self.frame = 0
+        self.visible = False
+
+        self._current = dict.fromkeys(self.PHASES, 0.0)
+
+        # Seconds spent waiting so far, going up
+        self._idle_clock = idle_clock
+        self._last_mark = time.perf_counter()
+        self._last_idle = idle_clock()
+
+        self._overlay_lines: list[str] = []
+        self._overlay_built_at = 0.0
+        self._pen = Vector2.zero()
+
+        self._csv_file = None
+        self._csv = None
+        if csv_path:
+            self._csv_file = open(csv_path, "w", newline="")
+            self._csv = csv.writer(self._csv_file)
+            self._csv.writerow(["frame", *self.PHASES, "total"])
+
+    def begin_frame(self) -> None:
+        # Since the last frame we've been in the pacer. Anything that ran in
+        # there was a coroutine
+        self.mark("coroutines")
+
+    def mark(self, phase: str) -> None:
+        # Everything since the last mark goes to phase, minus any waiting
+        now = time.perf_counter()
+        idle = self._idle_clock()
+        self._current[phase] += (now - self._last_mark) - (idle - self._last_idle)
+        self._last_mark = now
+        self._last_idle = idle
+
+    def end_frame(self) -> None:
+        total = sum(self._current.values())
+
+        for phase in self.PHASES:
+            self.samples[phase].append(self._current[phase])
+        self.totals.append(total)
+
+        if self._csv:
+            self._csv.writerow(
+                [self.frame]
+                + [f"{self._current[p] * 1000:.3f}" for p in self.PHASES]
+                + [f"{total * 1000:.3f}"]
+            )
+
+        for phase in self.PHASES:
+            self._current[phase] = 0.0
+        self.frame += 1
+
+    def histogram(self) -> list[int]:
+        # Frame counts per bucket over the rolling window
+        counts = [0] * (len(self.BUCKETS) + 1)
+        for total in self.totals:
+            ms = total * 1000
+            for i, limit in enumerate(self.BUCKETS):
+                if ms < limit:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+    def build_overlay(self) -> list[str]:
+        if not self.totals:
+            return []
+
+        lines = [f"frame {self.frame}  (last {len(self.totals)}, ms)"]
+        lines.append("phase       avg    max")
+
+        for phase in self.PHASES + ("total",):
+            samples = self.totals if phase == "total" else self.samples[phase]
+            avg = sum(samples) / len(samples) * 1000
+            worst = max(samples) * 1000
+            lines.append(f"{phase:<10} {avg:>5.2f} {worst:>6.2f}")
+
+        counts = self.histogram()
+        most = max(counts) or 1
+        lower = 0
+        for limit, count in zip(self.BUCKETS + (None,), counts):
+            label = f"<{limit}" if limit else f"{lower}+"
+            bar = "█" * round(count / most * 16)
+            lines.append(f"{label:>4} {bar} {count}")
+            lower = limit
+
+        return lines
+
+    def draw(self, font: GlyphAtlas, font_size: int) -> None:
+        if not self.visible:
+            return
+
+        now = time.perf_counter()
+        if now - self._overlay_built_at > self.OVERLAY_INTERVAL:
+            self._overlay_lines = self.build_overlay()
+            self._overlay_built_at = now
+
+        for i, line in enumerate(self._overlay_lines):
+            draw_text(font, line, self._pen.set(8, 8 + i * font_size), font_size, rl.GREEN)
+
+    def close(self) -> None:
+        if self._csv_file:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv = None
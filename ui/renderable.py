@@ -1,50 +1,123 @@
 from __future__ import annotations
 
 import pyray as rl
+from ui.backend import Backend
+from ui.pacing import pacer
 from ui.vector2 import Vector2
+from etc.font import GlyphAtlas, GlyphMetrics
 
 class Renderable:
     # I'm trying out this kwargs pattern for passing arguments up the
     # inheritence chain. I was worried it wouldn't catch parameter typos until
     # it dawned upon me that I don't use autocomplete
 
-    font: rl.Font
+    font: GlyphAtlas
     font_size: int
+    glyph_metrics: GlyphMetrics
 
     def __init__(self, **kwargs) -> None:
         self.position = kwargs.pop("position", Vector2.zero())
         self.static_size = kwargs.pop("static_size", None)
 
-        if "parent" in kwargs:
-            kwargs.pop("parent").add_child(self)
+        self.parent: Renderable | None = None
+        self._children: list[Renderable] = []
+        # Kept up to date as children come, go, and get (de)activated, since
+        # it's walked constantly
+        self._active_children: list[Renderable] = []
+
+        # Layout is only recomputed for dirty nodes or when the size we're
+        # given changes. Everything starts out dirty
+        self._layout_dirty = True
+        self._allocated_size: Vector2 | None = None
+
+        # measure() result, kept until our layout changes. Parents ask for it
+        # while laying us out, so each pass measures every node at most once
+        self._measure_cache: Vector2 | None = None
+
+        # Reused every frame so rendering doesn't allocate
+        self._render_position = Vector2.zero()
 
         # An "inactive" node isn't processed or rendered
-        self.active = kwargs.pop("active", True)
+        self._active = kwargs.pop("active", True)
+
+        if "parent" in kwargs:
+            kwargs.pop("parent").add_child(self)
 
         # Just for debug
         self.name = kwargs.pop("name", None)
 
-        self._children: list[Renderable] = []
-
         # All the arguments should have been eaten before here. Otherwise, the
         # argument is misspelled. We're all picky eaters here
         assert not kwargs
 
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @active.setter
+    def active(self, value: bool) -> None:
+        if value == self._active:
+            return
+        self._active = value
+
+        if self.parent:
+            self.parent.on_child_activation_changed(self)
+
     @property
     def active_children(self) -> list[Renderable]:
-        return [x for x in self._children if x.active]
+        # Shared, don't modify it!
+        return self._active_children
+
+    def on_child_activation_changed(self, child: Renderable) -> None:
+        # Showing/hiding a child changes how we lay things out. Override to
+        # care about it some other way
+        self.refresh_active_children()
+        self.invalidate_layout()
+
+    def refresh_active_children(self) -> None:
+        # For when _children was changed behind our back. Same list object so
+        # nobody holding onto it goes stale
+        self._active_children[:] = [x for x in self._children if x._active]
     
     def add_child(self, child: Renderable) -> None:
+        child.parent = self
         self._children.append(child)
+        if child._active:
+            self._active_children.append(child)
+        self.invalidate_layout()
         
     def clear_children(self) -> None:
+        for child in self._children:
+            child.parent = None
+            child.free()
         self._children.clear()
+        self._active_children.clear()
+        self.invalidate_layout()
+
+    def free(self) -> None:
+        # Called when we're dropped from the tree for good. Anything holding
+        # GPU resources should let go of them here
+        for child in self._children:
+            child.free()
+
+    def invalidate_layout(self) -> None:
+        # Dirty us and everything above us. Always walk the whole way up; an
+        # inactive node can be left dirty under a clean parent, so stopping at
+        # the first dirty node isn't safe. The tree is shallow anyway
+        node = self
+        while node:
+            node._layout_dirty = True
+            node._measure_cache = None
+            node = node.parent
+
+        # Something changed, so whatever's on screen is stale
+        pacer.request_redraw()
 
     def render_self(self, position: Vector2) -> None:
         raise NotImplementedError
 
     def render(self, position) -> None:
-        position = position.copy() + self.position
+        position = self._render_position.set_sum(position, self.position)
 
         # Always render children behind parent
         for child in self.active_children:
@@ -52,20 +125,42 @@ class Renderable:
 
         self.render_self(position)
 
+    def needs_reflow(self, allocated_size: Vector2) -> bool:
+        return self._layout_dirty or allocated_size != self._allocated_size
+
     def reflow_layout(self, allocated_size: Vector2) -> None:
+        # Clean subtrees that get the same size as last time keep their layout
+        if not self.needs_reflow(allocated_size):
+            return
+
+        self._layout_dirty = False
+        self._measure_cache = None
+        if self._allocated_size is None:
+            self._allocated_size = allocated_size.copy()
+        else:
+            self._allocated_size.set_from(allocated_size)
+
         self.reflow_layout_self(allocated_size)
-        for child in self.active_children:
-            child.reflow_layout(allocated_size)
+        self.reflow_layout_children(allocated_size)
 
     def reflow_layout_self(self, allocated_size: Vector2) -> None:
         pass
 
-    def measure(self) -> Vector2:
-        # Content size
+    def reflow_layout_children(self, allocated_size: Vector2) -> None:
+        for child in self.active_children:
+            child.reflow_layout(allocated_size)
 
-        # TODO: Per-frame cache? This tends to compute
+    def measure(self) -> Vector2:
+        # Content size. Layout code should call measured() instead
         return Vector2.zero()
 
+    def measured(self) -> Vector2:
+        # Cached measure(). Shared, don't modify it!
+        size = self._measure_cache
+        if size is None:
+            size = self._measure_cache = self.measure()
+        return size
+
     def __repr__(self):
         if self.name:
             return f"<{self.__class__.__name__}: {self.name}>"
@@ -84,7 +179,7 @@ class RectRenderable(Renderable):
         self.color = color
 
     def render_self(self, position: Vector2) -> None:
-        rl.draw_rectangle_v(
+        Backend.current.draw_rectangle_v(
             position.to_raylib(),
             self.static_size.to_raylib(),
             self.color
@@ -94,5 +189,27 @@ class RectRenderable(Renderable):
         return self.static_size
 
 class OverlayRenderable(RectRenderable):
+    # Goes over everything (fades). Gets its own color struct so the alpha can
+    # be tweened in place instead of making a new color every frame
+    def __init__(self, color: rl.Color | tuple, **kwargs) -> None:
+        if isinstance(color, tuple):
+            color = rl.Color(*color)
+        else:
+            color = rl.Color(color.r, color.g, color.b, color.a)
+        super().__init__(color, **kwargs)
+
+    @property
+    def alpha(self) -> float:
+        return self.color.a / 0xFF
+
+    @alpha.setter
+    def alpha(self, value: float) -> None:
+        self.color.a = round(0xFF * max(0.0, min(1.0, value)))
+        pacer.request_redraw()
+
     def reflow_layout_self(self, allocated_size: Vector2) -> None:
-        self.static_size = allocated_size
+        # Parents may hand out the same vector to everybody, so copy it
+        if self.static_size is None:
+            self.static_size = allocated_size.copy()
+        else:
+            self.static_size.set_from(allocated_size)
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pyray as rl
+from typing import Optional
+
+# NOTE: "style" is currently just color. In the future I want to support many
+# types of text styling: sizes, brightness, animations, bg color, gradients,
+# masks, etc...
+
+# Every style is made once and then referred to by its index in here. Text
+# chunks only carry the index, so parsing markup never makes any colors
+_colors: list[rl.Color] = []
+_tag_to_id: dict[str, int] = {}
+
+# Goes up whenever an existing style changes color, so anything that drew
+# with the old colors ahead of time (baked text) knows it's stale
+generation = 0
+
+def register(color: rl.Color | tuple, tag: Optional[str] = None) -> int:
+    global generation
+
+    # Registering a tag that already exists recolors it (same id), so
+    # everything already parsed with it picks up the new color too
+    if not isinstance(color, tuple):
+        color = (color.r, color.g, color.b, color.a)
+
+    # pyray colors are tuples that get converted on every call. Make a real
+    # struct once instead
+    color = rl.Color(*color)
+
+    if tag is not None and tag in _tag_to_id:
+        style_id = _tag_to_id[tag]
+        _colors[style_id] = color
+        generation += 1
+        return style_id
+
+    _colors.append(color)
+    style_id = len(_colors) - 1
+
+    if tag is not None:
+        _tag_to_id[tag] = style_id
+    return style_id
+
+def from_tag(tag: str) -> int:
+    return _tag_to_id[tag]
+
+def get_color(style_id: int) -> rl.Color:
+    return _colors[style_id]
+
+DEFAULT = register((0xB0, 0xB0, 0xB0, 0xFF))
+
+register(rl.ORANGE, "act")
+register(rl.WHITE, "noun")
+register(rl.RED, "red")
+register(rl.WHITE, "white")
+register(rl.DARKGRAY, "gray")
+register(rl.GREEN, "green")
+register(rl.GOLD, "gold")
+register(rl.YELLOW, "yellow")
+register(rl.BLUE, "blue")
+register(rl.DARKPURPLE, "claire")
+register(rl.DARKGREEN, "darkgreen")
+register((0x99, 0x11, 0x11, 0xFF), "darkred")
+register(rl.DARKBLUE, "darkblue")
+register((0x77, 0xA6, 0x84, 0xFF), "palegreen")
+register((0x77, 0x80, 0xA6, 0xFF), "paleblue")
+register((0x9E, 0xAB, 0x60, 0xFF), "paleyellow")
@@ -1,22 +1,34 @@
 from __future__ import annotations
 
+import os
+import math
+import bisect
 import asyncio
+import functools
 import pyray as rl
 from typing import Optional, Callable
 
+from ui import style
+from etc.font import GlyphAtlas
+from ui.backend import Backend
 from ui.vector2 import Vector2
 from ui.renderable import Renderable
 
-TEXT_COLOR = rl.Color(0xB0, 0xB0, 0xB0, 0xFF)
-
 class RichTextChunk:
+    __slots__ = ("text", "style")
+
     def __init__(
         self,
         text: str,
-        color: rl.Color = TEXT_COLOR
+        style: int = style.DEFAULT
     ) -> None:
         self.text = text
-        self.color = color
+        # An id from ui.style, not a color
+        self.style = style
+
+    @property
+    def color(self) -> rl.Color:
+        return style.get_color(self.style)
 
 class RichText:
     def __init__(self, nodes: list[RichTextChunk]) -> None:
@@ -24,31 +36,48 @@ class RichText:
         assert isinstance(nodes, list), "Pls remember to use from_value"
         self.nodes = nodes
 
+        # Where each chunk starts in the raw text, so we can find the chunk a
+        # character index lands in with a binary search
+        self.offsets = []
+        length = 0
+        for node in nodes:
+            self.offsets.append(length)
+            length += len(node.text)
+        self._length = length
+        self._raw: Optional[str] = None
+
+        # What we're a leading slice of (ourselves if we aren't one). Lets
+        # TextRenderable tell a growing typewriter line apart from new text
+        self.source = self
+
     def get_n_leading(self, n: int) -> RichText:
         # Gets leading n characters while preserving rich attributes.
         # NOTE: May be called a lot for typewriter effect. Be nimble, be quick!
         # Jump over a candlestick!
+        if n >= self._length:
+            return self
 
-        nodes = []
-        for node in self.nodes:
-            partial_node = RichTextChunk("", color=node.color)
-            nodes.append(partial_node)
+        # Chunks that start before n; the last of those gets cut short
+        keep = bisect.bisect_left(self.offsets, n)
+        nodes = self.nodes[:keep]
 
-            for char in node.text:
-                if not n: break
-                partial_node.text += char
-                n -= 1
+        if nodes:
+            last = nodes[-1]
+            cut = n - self.offsets[keep - 1]
+            if cut < len(last.text):
+                nodes[-1] = RichTextChunk(last.text[:cut], style=last.style)
 
-            if not n:
-                break
-
-        return RichText(nodes)
+        out = RichText(nodes)
+        out.source = self.source
+        return out
 
     def get_raw(self) -> str:
-        return "".join([n.text for n in self.nodes])
+        if self._raw is None:
+            self._raw = "".join([n.text for n in self.nodes])
+        return self._raw
 
     def __len__(self) -> int:
-        return sum([len(n.text) for n in self.nodes])
+        return self._length
 
     @classmethod
     def from_value(cls, value: str| RichTextChunk | list[RichTextChunk]) -> RichText:
@@ -63,106 +92,215 @@ class RichText:
         assert False, f"Won't cast from {type(value)}"
 
     @staticmethod
-    def tag_to_style(tag: str) -> rl.Color:
-        # NOTE: "style" is currently just color. In the future I want to support
-        # many types of text styling: sizes, brightness, animations, bg color,
-        # gradients, masks, etc...
-
-        return {
-            "act": rl.ORANGE,
-            "noun": rl.WHITE,
-            "red": rl.RED,
-            "white": rl.WHITE,
-            "gray": rl.DARKGRAY,
-            "green": rl.GREEN,
-            "gold": rl.GOLD,
-            "yellow": rl.YELLOW,
-            "blue": rl.BLUE,
-            "claire": rl.DARKPURPLE,
-            "darkgreen": rl.DARKGREEN,
-            "darkred": rl.Color(0x99, 0x11, 0x11, 0xFF),
-            "darkblue": rl.DARKBLUE,
-            "palegreen": rl.Color(0x77, 0xA6, 0x84, 0xFF),
-            "paleblue": rl.Color(0x77, 0x80, 0xA6, 0xFF),
-            "paleyellow": rl.Color(0x9E, 0xAB, 0x60, 0xFF),
-        }[tag]
+    def tag_to_style(tag: str) -> int:
+        # Styles live in ui.style now; new tags can be added with
+        # style.register(color, tag)
+        return style.from_tag(tag)
 
     @classmethod
     def from_str(cls, string: str) -> RichText:
-        default = {"type": "text", "content": ""}
-        bits = [dict(default)]
-
-        for char in string:
-            if char == "<":
-                new = dict(default)
-                new["type"] = "tag"
-                bits.append(new)
-                continue
-            elif char == ">":
-                assert bits[-1]["type"] == "tag"
-                bits.append(dict(default))
-                continue
-            bits[-1]["content"] += char
-
-        # Could be one pass if I hated myself
-        out = []
-        style_stack = []
+        # Most of what we print is the same handful of constant strings (room
+        # descriptions, help, battle messages), so parsed markup is cached.
+        # See parse_markup.cache_info() for hits/misses
+        return parse_markup(string)
+
+@functools.lru_cache(maxsize=1024)
+def parse_markup(string: str) -> RichText:
+    # Turns "<red>hi</red>" markup into a RichText. One pass now; turns out I
+    # only had to hate myself a little. Cached results are shared, so don't
+    # mutate what comes out of here
+    out = []
+    style_stack = []
+    current_style = style.DEFAULT
+    pos = 0
+
+    while True:
+        tag_start = string.find("<", pos)
+        text_end = len(string) if tag_start == -1 else tag_start
+
+        text = string[pos:text_end]
+        assert ">" not in text, f"Stray '>' in {string!r}"
+        if text:
+            out.append(RichTextChunk(text, style=current_style))
+
+        if tag_start == -1:
+            break
+
+        tag_end = string.find(">", tag_start)
+        assert tag_end != -1, f"Unclosed tag in {string!r}"
+
+        tag = string[tag_start + 1:tag_end]
+        assert tag
+
+        tag_name = tag.lstrip("/")
+
+        if tag[0] == "/":
+            assert style_stack
+            assert style_stack[-1][0] == tag_name
+            style_stack.pop()
+        else:
+            style_stack.append((tag_name, RichText.tag_to_style(tag_name)))
 
-        for bit in bits:
-            if bit["type"] == "text":
-                # I wish there was a .get for lists
-                color = style_stack[-1]["color"] if style_stack else TEXT_COLOR
-                out.append(RichTextChunk(bit["content"], color=color))
-                continue
+        # I wish there was a .get for lists
+        current_style = style_stack[-1][1] if style_stack else style.DEFAULT
+        pos = tag_end + 1
 
-            # Tag
-            assert bit["type"] == "tag"
-            assert bit["content"]
+    return RichText(out)
 
-            closing = bit["content"][0] == "/"
-            tag_name = bit["content"].lstrip("/")
+_draw_pen = Vector2.zero()
 
-            if closing:
-                assert style_stack
-                assert style_stack[-1]["tag"] == tag_name
-                style_stack.pop()
-                continue
-
-            style_stack.append({
-                "tag": tag_name,
-                "color": cls.tag_to_style(tag_name)
-            })
+def draw_text(font: GlyphAtlas, text: str, position: Vector2, font_size: int, color: rl.Color) -> None:
+    # draw_text_ex for text that might have glyphs outside the base page.
+    # TextRenderable splits its segments up front, this is for one-offs
+    for page, run, run_x in font.split_runs(text, font_size):
+        Backend.current.draw_text_ex(
+            font.page(page),
+            run,
+            _draw_pen.set(position.x + run_x, position.y).to_raylib(),
+            font_size,
+            0,
+            color
+        )
 
-        return RichText(out)
+class WrapState:
+    # Where wrapping left off, so a growing prefix of the same text (the
+    # typewriter effect) only has to wrap the new characters
+    def __init__(self, width: float, font_size: int) -> None:
+        self.width = width
+        self.font_size = font_size
+
+        self.index = 0
+        self.line_width = 0.0
+        self.word_width = 0.0
+        self.last_space_index = -1
+
+        self.x_prefix = [0.0]
+        self.newlines: list[int] = []
+
+        # Segments for every line but the last. A break only ever goes into
+        # the line we're on, so lines before it are done and never rebuilt
+        self.segments: list[tuple[int, int, float, list]] = []
+        self.done_segments = 0
+        self.line = 0
+        self.line_start = 0
+        self.max_x = 0.0
+        self.breaks_done = 0
+        self.newlines_done = 0
 
 class TextRenderable(Renderable):
+    # Once text has sat unchanged for this many frames it gets baked into a
+    # texture and drawn as one quad. Typewriter text changes every few frames,
+    # so this keeps us from baking every intermediate state
+    BAKE_AFTER_FRAMES = 30
+
     def __init__(self, text: str | RichText, **kwargs):
         super().__init__(**kwargs)
-        self.text = RichText.from_value(text)
-        assert isinstance(self.text, RichText)
         self.inserted_break_indices = []
 
-    def reflow_layout_self(self, allocated_size: Vector2) -> None:
-        # Calculate text wrapping. Probably expensive w/ these ffi calls!!!
-        self.inserted_break_indices.clear()
-        last_space_index = -1
-        line_width = 0.0
-        current_word_width = 0.0
-        scale_factor = self.font_size / self.font.baseSize
+        self.baked: Optional[rl.RenderTexture] = None
+        self._baked_generation = 0
+        self._settled_frames = 0
+
+        # (style id, line index, x offset, runs) ready to be drawn. Built as
+        # we wrap so rendering and measuring just replay them
+        self.segments: Optional[list[tuple[int, int, float, list]]] = None
+        self._measured = Vector2.zero()
+        self._pen = Vector2.zero()
+
+        # Until we're given a size, don't wrap at all
+        self._wrap_width = float("inf")
+        self._wrap_state: Optional[WrapState] = None
 
+        self._text: Optional[RichText] = None
+        self.text = text
+
+    @property
+    def text(self) -> RichText:
+        return self._text
+
+    @text.setter
+    def text(self, value: str | RichText) -> None:
+        old = self._text
+        self._text = RichText.from_value(value)
+        assert isinstance(self._text, RichText)
+
+        # More of the same text (typewriter) picks wrapping up where it left
+        # off. Anything else starts over
+        if (
+            old is None
+            or self._text.source is not old.source
+            or len(self._text) < len(old)
+        ):
+            self._wrap_state = None
+
+        self.segments = None
+        self.invalidate_layout()
+
+    def needs_reflow(self, allocated_size: Vector2) -> bool:
+        # Wrapping only cares about width. Stacks hand out a new height every
+        # time a line is added, which shouldn't rewrap the whole log
+        return self._layout_dirty or allocated_size.x != self._allocated_size.x
+
+    def reflow_layout_self(self, allocated_size: Vector2) -> None:
         # Spudge it to make it seem more friendly
-        max_line_width = allocated_size.x - 24.0
+        self._wrap_width = allocated_size.x - 24.0
+        self.wrap()
+
+    def wrap(self) -> None:
+        # Calculate text wrapping. Widths come from the font's advance table so
+        # we don't touch ffi per character
 
-        for i, char in enumerate(self.text.get_raw()):
-            glyph_index = rl.get_glyph_index(self.font, ord(char))
-            char_width = self.font.glyphs[glyph_index].advanceX * scale_factor
+        # We only get rewrapped when the text, width or font size changed, all
+        # of which make the baked texture wrong
+        self.unbake()
+
+        # Typewriter text is a prefix of its source. Go by the source's raw
+        # text (built once) and our length instead of joining ours every time
+        raw = self.text.source.get_raw()
+        end = len(self.text)
+
+        state = self._wrap_state
+        if (
+            state is None
+            or state.width != self._wrap_width
+            or state.font_size != self.font_size
+        ):
+            state = self._wrap_state = WrapState(self._wrap_width, self.font_size)
+            self.inserted_break_indices.clear()
+
+        last_space_index = state.last_space_index
+        line_width = state.line_width
+        current_word_width = state.word_width
+
+        # Get any characters we've never seen rasterized first, so their
+        # widths are real
+        self.glyph_metrics.ensure(raw[state.index:end])
+
+        advances = self.glyph_metrics.advances_for(self.font_size)
+        fallback = self.glyph_metrics.fallback_for(self.font_size)
+        max_line_width = state.width
+
+        # x_prefix[i] is the width of raw[:i] so any substring can be measured
+        # with one subtraction
+        x_prefix = state.x_prefix
+        x_total = x_prefix[-1]
+
+        # Only the characters we haven't seen yet
+        for i in range(state.index, end):
+            char = raw[i]
 
             if char == "\n":
+                x_prefix.append(x_total)
+                state.newlines.append(i)
                 line_width = 0.0
                 current_word_width = 0.0
                 last_space_index = -1
                 continue
 
+            char_width = advances.get(ord(char), fallback)
+            x_total += char_width
+            x_prefix.append(x_total)
+
             line_width += char_width
             current_word_width += char_width
 
@@ -181,60 +319,193 @@ class TextRenderable(Renderable):
                     current_word_width = 0.0
                 last_space_index = -1
 
-    def get_wrapped_chunk_text(self) -> dict:
-        # TODO: Cache per frame/inserted_break_indices
-        out = {}
-        big_i = 0
+        state.index = end
+        state.last_space_index = last_space_index
+        state.line_width = line_width
+        state.word_width = current_word_width
+
+        self.build_segments(raw, end, state)
+
+    def build_segments(self, raw: str, end: int, state: WrapState) -> None:
+        # Only from the start of the last line on; see WrapState. Every place
+        # a line ends: after an inserted break, or on a "\n" (which is eaten).
+        # Sorting tuples puts a break before a "\n" at the same spot
+        cuts = [(i + 1, 0) for i in self.inserted_break_indices[state.breaks_done:]]
+        cuts += [(i, 1) for i in state.newlines[state.newlines_done:]]
+        cuts.sort()
+        cuts.append((end + 1, 0))
+
+        segments = state.segments
+        del segments[state.done_segments:]
+
+        x_prefix = state.x_prefix
+        source = self.text.source
+        line = state.line
+        x = 0.0
+        max_x = state.max_x
+        cut_i = 0
+        pos = state.line_start
+
+        # The line we're on (and everything after it) gets put together here
+        # first, then split into runs
+        pending = []
+
+        def finish_pending() -> None:
+            for style_id, seg_line, seg_x, text in pending:
+                segments.append(
+                    (style_id, seg_line, seg_x, self.font.split_runs(text, self.font_size))
+                )
+            pending.clear()
 
-        for chunk in self.text.nodes:
-            text = ""
-            for char in chunk.text:
-                text += char
-                if big_i in self.inserted_break_indices:
-                    text += "\n"
-                big_i += 1
-            out[chunk] = text
+        # First chunk with anything at or after pos
+        node_i = max(0, bisect.bisect_right(source.offsets, pos) - 1)
 
-        return out
+        for chunk in source.nodes[node_i:]:
+            chunk_start = source.offsets[node_i]
+            node_i += 1
+            if chunk_start >= end:
+                break
+            chunk_end = min(chunk_start + len(chunk.text), end)
+
+            while True:
+                cut, skip = cuts[cut_i]
+                seg_end = min(cut, chunk_end)
+
+                if seg_end > pos:
+                    piece = raw[pos:seg_end]
+                    last = pending[-1] if pending else None
+
+                    if last and last[0] == chunk.style and last[1] == line:
+                        # Neighbouring chunks with the same style draw as one run
+                        pending[-1] = (last[0], line, last[2], last[3] + piece)
+                    else:
+                        pending.append((chunk.style, line, x, piece))
+
+                    x += x_prefix[seg_end] - x_prefix[pos]
+                    pos = seg_end
+
+                if cut > chunk_end:
+                    break
+
+                max_x = max(max_x, x)
+                line += 1
+                x = 0.0
+                pos = cut + skip
+                cut_i += 1
+
+                # That line's done for good
+                finish_pending()
+                state.done_segments = len(segments)
+                state.line = line
+                state.line_start = pos
+                state.max_x = max_x
+                if skip:
+                    state.newlines_done += 1
+                else:
+                    state.breaks_done += 1
 
-    def render_self(self, position: Vector2) -> None:
-        pointer = position.copy()
+        finish_pending()
+        max_x = max(max_x, x)
+        self.segments = segments
 
-        for chunk, text in self.get_wrapped_chunk_text().items():
-            lines = text.split("\n")
+        # Same numbers measure_text_ex would give for the wrapped string
+        if not end:
+            self._measured = Vector2.zero()
+            return
 
-            while lines:
-                line = lines.pop(0)
-                box = Vector2.from_raylib(rl.measure_text_ex(
-                    self.font,
-                    line,
-                    self.font_size,
-                    0,
-                ))
+        line_spacing = self.glyph_metrics.LINE_SPACING
+        self._measured = Vector2(
+            max_x,
+            self.font_size + (self.font_size + line_spacing) * line
+        )
 
-                rl.draw_text_ex(
-                    self.font,
-                    line,
-                    pointer.to_raylib(),
+    def render_self(self, position: Vector2) -> None:
+        if self.segments is None:
+            self.wrap()
+
+        if self.baked and self._baked_generation != style.generation:
+            # Somebody recolored a style since
+            self.unbake()
+
+        if not self.baked:
+            self._settled_frames += 1
+            if self._settled_frames >= self.BAKE_AFTER_FRAMES:
+                self.bake()
+
+        if self.baked:
+            texture = self.baked.texture
+            # Render textures are upside down. Already multiplied by alpha
+            # (see bake), so don't do it again
+            Backend.current.begin_blend_mode(rl.BlendMode.BLEND_ALPHA_PREMULTIPLY)
+            Backend.current.draw_texture_rec(
+                texture,
+                rl.Rectangle(0, 0, texture.width, -texture.height),
+                position.to_raylib(),
+                rl.WHITE
+            )
+            Backend.current.end_blend_mode()
+            return
+
+        self.draw_segments(position.x, position.y)
+
+    def draw_segments(self, x: float, y: float) -> None:
+        pen = self._pen
+        for style_id, line, seg_x, runs in self.segments:
+            color = style.get_color(style_id)
+            for page, text, run_x in runs:
+                pen.set(x + seg_x + run_x, y + line * self.font_size)
+                Backend.current.draw_text_ex(
+                    self.font.page(page),
+                    text,
+                    pen.to_raylib(),
                     self.font_size,
                     0,
-                    chunk.color
+                    color
                 )
 
-                pointer.x += box.x
+    def bake(self) -> None:
+        width = math.ceil(self._measured.x)
+        height = math.ceil(self._measured.y)
+        if not width or not height:
+            return
+
+        self.baked = Backend.current.load_render_texture(width, height)
+        self._baked_generation = style.generation
+
+        # Normal alpha blending onto a transparent texture multiplies the
+        # alpha channel by itself too, and the edges of every glyph come out
+        # dark once the texture gets blended again. Colors get multiplied by
+        # alpha, alpha gets added up properly, and it's drawn premultiplied
+        Backend.current.begin_texture_mode(self.baked)
+        Backend.current.clear_background(rl.BLANK)
+        Backend.current.rl_set_blend_factors_separate(
+            rl.RL_SRC_ALPHA, rl.RL_ONE_MINUS_SRC_ALPHA,
+            rl.RL_ONE, rl.RL_ONE_MINUS_SRC_ALPHA,
+            rl.RL_FUNC_ADD, rl.RL_FUNC_ADD
+        )
+        Backend.current.begin_blend_mode(rl.BlendMode.BLEND_CUSTOM_SEPARATE)
+        self.draw_segments(0, 0)
+        Backend.current.end_blend_mode()
+        Backend.current.end_texture_mode()
+
+    def unbake(self) -> None:
+        self._settled_frames = 0
+        if not self.baked:
+            return
+        Backend.current.unload_render_texture(self.baked)
+        self.baked = None
 
-                # Always add n-1 lines y-wise
-                if lines:
-                    pointer.x = position.x
-                    pointer.y += self.font_size
+    def free(self) -> None:
+        self.unbake()
+        super().free()
 
     def measure(self) -> Vector2:
-        return Vector2.from_raylib(rl.measure_text_ex(
-            self.font,
-            "".join(self.get_wrapped_chunk_text().values()),
-            self.font_size,
-            0,
-        ))
+        # Only changes when the text or wrapping does
+        if self.segments is None:
+            self.wrap()
+        return self._measured
+
+PLACEHOLDER_STYLE = style.register(rl.GRAY)
 
 class InputRenderable(Renderable):
     def __init__(
@@ -244,23 +515,74 @@ class InputRenderable(Renderable):
     ) -> None:
         super().__init__(**kwargs)
         self.placeholder = placeholder
-        self.prompt_str = None
+        self._prompt_str = None
         self.future = None
         self.input_disabled = False
 
-        self.buffer = ""
+        self._buffer = ""
 
         self.history = []
         self.history_idx = 0
 
-    async def prompt(self, prompt: str) -> str:
+        # Given what's typed so far, returns everything it could be finished
+        # off as. Only set while a prompt that wants tab completion is up
+        self.completer: Optional[Callable[[str], list[str]]] = None
+
+    # Both of these change what we show (and so our size)
+
+    @property
+    def buffer(self) -> str:
+        return self._buffer
+
+    @buffer.setter
+    def buffer(self, value: str) -> None:
+        if value != self._buffer:
+            self._buffer = value
+            self.invalidate_layout()
+
+    @property
+    def prompt_str(self) -> Optional[str]:
+        return self._prompt_str
+
+    @prompt_str.setter
+    def prompt_str(self, value: Optional[str]) -> None:
+        if value != self._prompt_str:
+            self._prompt_str = value
+            self.invalidate_layout()
+
+    async def prompt(
+        self,
+        prompt: str,
+        completer: Optional[Callable[[str], list[str]]] = None
+    ) -> str:
         self.prompt_str = prompt
+        self.completer = completer
 
         assert not self.future
         loop = asyncio.get_running_loop()
         self.future = loop.create_future()
 
-        return await self.future
+        try:
+            return await self.future
+        finally:
+            self.completer = None
+
+    def complete(self) -> None:
+        if not self.completer:
+            return
+
+        options = self.completer(self.buffer)
+        if not options:
+            return
+
+        if len(options) == 1:
+            self.buffer = options[0] + " "
+            return
+
+        # Ambiguous. Fill in as much as they all agree on
+        common = os.path.commonprefix(options)
+        if len(common) > len(self.buffer):
+            self.buffer = common
 
     async def wait_for_enter(self) -> None:
         self.input_disabled = True
@@ -285,16 +607,14 @@ class InputRenderable(Renderable):
         return self.placeholder
 
     def measure(self) -> Vector2:
-        return Vector2.from_raylib(rl.measure_text_ex(
-            self.font,
+        return Vector2(*self.glyph_metrics.measure(
             self.get_visual_text(),
             self.font_size,
-            0,
         ))
 
     def process(self) -> None:
         # Submit
-        if rl.is_key_pressed(rl.KEY_ENTER):
+        if Backend.current.is_key_pressed(rl.KEY_ENTER):
             if self.future:
                 self.future.set_result(self.buffer)
                 self.future = None
@@ -308,15 +628,18 @@ class InputRenderable(Renderable):
         if self.input_disabled:
             return
 
-        while char := rl.get_char_pressed():
+        while char := Backend.current.get_char_pressed():
             self.buffer += chr(char)
 
+        if Backend.current.is_key_pressed(rl.KEY_TAB):
+            self.complete()
+
         if (
             self.buffer and
             # get_char_pressed automatically does echoing
             (
-                rl.is_key_pressed(rl.KEY_BACKSPACE) or
-                rl.is_key_pressed_repeat(rl.KEY_BACKSPACE)
+                Backend.current.is_key_pressed(rl.KEY_BACKSPACE) or
+                Backend.current.is_key_pressed_repeat(rl.KEY_BACKSPACE)
             )
         ):
             self.buffer = self.buffer[:-1]
@@ -324,9 +647,9 @@ class InputRenderable(Renderable):
 
         # History
         touched_history = True
-        if rl.is_key_pressed(rl.KEY_UP):
+        if Backend.current.is_key_pressed(rl.KEY_UP):
             self.history_idx -= 1
-        elif rl.is_key_pressed(rl.KEY_DOWN):
+        elif Backend.current.is_key_pressed(rl.KEY_DOWN):
             self.history_idx += 1
         else:
             touched_history = False
@@ -341,6 +664,12 @@ class InputRenderable(Renderable):
                 self.buffer = self.history[self.history_idx]
 
 
+    def holding_key(self) -> bool:
+        # Key repeats don't come with new key presses, and backspace's only
+        # show up on the frame they happen in, so keep frames coming for as
+        # long as anything's held
+        return Backend.current.is_any_key_down()
+
     def render_self(self, position: Vector2) -> None:
         # Let's maybe not do tooo much logic in render. but whatever
         self.process()
@@ -348,13 +677,6 @@ class InputRenderable(Renderable):
         chunk = RichTextChunk(self.get_visual_text())
 
         if not self.buffer:
-            chunk.color = rl.GRAY
+            chunk.style = PLACEHOLDER_STYLE
 
-        rl.draw_text_ex(
-            self.font,
-            chunk.text,
-            position.to_raylib(),
-            self.font_size,
-            0,
-            chunk.color
-        )
+        draw_text(self.font, chunk.text, position, self.font_size, chunk.color)
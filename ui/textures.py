@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+# Every GPU texture made from a file goes through here. The same file (with the
+# same processing) is only ever uploaded once, no matter how many renderables
+# show it, and it stays loaded for as long as anybody holds a handle to it.
+# Textures nobody's using anymore hang around in case they come back (the same
+# portrait every dialog line) until we go over the memory budget.
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import pyray as rl
+
+from ui.backend import Backend
+
+class TextureHandle:
+    __slots__ = ("key", "texture", "size_bytes", "refs")
+
+    def __init__(self, key: Hashable, texture: Any) -> None:
+        self.key = key
+        self.texture = texture
+        # Close enough: everything we load ends up RGBA8 on the GPU
+        self.size_bytes = texture.width * texture.height * 4
+        self.refs = 0
+
+class TextureManager:
+    def __init__(self, budget_bytes: int = 128 * 1024 * 1024) -> None:
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+
+        # Least recently acquired first
+        self._handles: OrderedDict[Hashable, TextureHandle] = OrderedDict()
+        self._pending: dict[Hashable, asyncio.Future] = {}
+
+    def acquire(self, key: Hashable, make_image: Callable[[], rl.Image]) -> TextureHandle:
+        # key should cover the path and anything done to the pixels, since
+        # make_image only gets called if we haven't got it already
+        handle = self._handles.get(key)
+        if not handle:
+            handle = self._upload(key, make_image())
+        return self._take(handle)
+
+    async def acquire_async(self, key: Hashable, make_image: Callable[[], rl.Image]) -> TextureHandle:
+        # Same thing, but make_image runs on a worker thread (see
+        # Backend.run_in_background). It had better only do CPU-side raylib
+        # stuff!
+        handle = self._handles.get(key)
+        if handle:
+            return self._take(handle)
+
+        # Two loads of the same thing at once share the work. The upload
+        # happens when it's done whether or not anyone's still waiting, so
+        # a cancelled load never leaks the image
+        future = self._pending.get(key)
+        if not future:
+            future = self._pending[key] = Backend.current.run_in_background(make_image)
+            future.add_done_callback(lambda f: self._finish_pending(key, f))
+
+        await asyncio.shield(future)
+
+        # A future that was done from the start (headless) doesn't wait for
+        # its callbacks, so upload now if they haven't yet
+        self._finish_pending(key, future)
+
+        handle = self._handles.get(key)
+        if not handle:
+            # Got evicted before we woke up (unlucky!). Go again
+            return await self.acquire_async(key, make_image)
+        return self._take(handle)
+
+    def release(self, handle: TextureHandle) -> None:
+        assert handle.refs > 0, f"Texture {handle.key} released too many times"
+        handle.refs -= 1
+
+        if not handle.refs:
+            self._enforce_budget()
+
+    def _finish_pending(self, key: Hashable, future: asyncio.Future) -> None:
+        # Whoever gets here first uploads
+        if self._pending.get(key) is not future:
+            return
+        del self._pending[key]
+        if future.cancelled() or future.exception():
+            return
+        self._upload(key, future.result())
+
+    def _upload(self, key: Hashable, image: rl.Image) -> TextureHandle:
+        texture = Backend.current.load_texture_from_image(image)
+        rl.unload_image(image)
+
+        handle = TextureHandle(key, texture)
+        self._handles[key] = handle
+        self.used_bytes += handle.size_bytes
+        return handle
+
+    def _take(self, handle: TextureHandle) -> TextureHandle:
+        handle.refs += 1
+        self._handles.move_to_end(handle.key)
+        self._enforce_budget()
+        return handle
+
+    def _enforce_budget(self) -> None:
+        # Only unused textures can go. If everything's in use we're just over
+        # budget for a while
+        if self.used_bytes <= self.budget_bytes:
+            return
+
+        for handle in list(self._handles.values()):
+            if self.used_bytes <= self.budget_bytes:
+                break
+            if handle.refs:
+                continue
+
+            del self._handles[handle.key]
+            self.used_bytes -= handle.size_bytes
+            Backend.current.unload_texture(handle.texture)
+
+textures = TextureManager()
@@ -1,11 +1,17 @@
 from __future__ import annotations
-from typing import Any
+from typing import Any, Optional
 import pyray as rl
 
 class Vector2:
+    # These get made and thrown around constantly in layout and rendering, so
+    # they're slotted, the operators skip any generic dispatch, and the hot
+    # paths use the in-place versions below to avoid making garbage every frame
+    __slots__ = ("x", "y", "_rl")
+
     def __init__(self, x: int, y: int) -> None:
         self.x = x
         self.y = y
+        self._rl: Optional[rl.Vector2] = None
 
     @classmethod
     def zero(cls) -> Vector2:
@@ -16,7 +22,16 @@ class Vector2:
         return cls(v.x, v.y)
 
     def to_raylib(self) -> rl.Vector2:
-        return rl.Vector2(self.x, self.y)
+        # Each vector keeps one cffi struct around and refreshes it, rather
+        # than allocating one per draw call. The struct is shared, so don't
+        # hold onto it past the call you're passing it to
+        struct = self._rl
+        if struct is None:
+            struct = self._rl = rl.Vector2(self.x, self.y)
+        else:
+            struct.x = self.x
+            struct.y = self.y
+        return struct
 
     def copy(self) -> Vector2:
         return Vector2(self.x, self.y)
@@ -24,19 +39,84 @@ class Vector2:
     def __repr__(self) -> str:
         return f"({self.x}, {self.y})"
 
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Vector2):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    # Anything that isn't a Vector2 is treated as a scalar (member-wise)
+
+    def __add__(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            return Vector2(self.x + other.x, self.y + other.y)
+        return Vector2(self.x + other, self.y + other)
+
+    def __sub__(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            return Vector2(self.x - other.x, self.y - other.y)
+        return Vector2(self.x - other, self.y - other)
+
+    def __mul__(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            return Vector2(self.x * other.x, self.y * other.y)
+        return Vector2(self.x * other, self.y * other)
+
+    def __truediv__(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            return Vector2(self.x / other.x, self.y / other.y)
+        return Vector2(self.x / other, self.y / other)
+
+    # In-place versions. These all return self so they can be chained. Not
+    # hooked up to += and friends on purpose: plenty of code expects a += b
+    # to leave whatever a used to point to alone
+
+    def set(self, x: float, y: float) -> Vector2:
+        self.x = x
+        self.y = y
+        return self
+
+    def set_from(self, other: Vector2) -> Vector2:
+        self.x = other.x
+        self.y = other.y
+        return self
+
+    def set_sum(self, a: Vector2, b: Vector2) -> Vector2:
+        self.x = a.x + b.x
+        self.y = a.y + b.y
+        return self
 
-    def _math_op(self, other: Any, op: callable) -> Any:
-        # I don't know how many vector ops we do but this could come and bit us
-        # later performance-wise BUT i love being lazy
+    def iadd(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            self.x += other.x
+            self.y += other.y
+        else:
+            self.x += other
+            self.y += other
+        return self
 
-        if isinstance(other, Vector2):
-            return Vector2(op(self.x, other.x), op(self.y, other.y))
+    def isub(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            self.x -= other.x
+            self.y -= other.y
+        else:
+            self.x -= other
+            self.y -= other
+        return self
 
-        assert isinstance(other, (int, float))
-        # Member-wise
-        return Vector2(op(self.x, other), op(self.y, other))
+    def imul(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            self.x *= other.x
+            self.y *= other.y
+        else:
+            self.x *= other
+            self.y *= other
+        return self
 
-    def __add__(self, other: Any) -> Any: return self._math_op(other, lambda a, b: a + b)
-    def __sub__(self, other: Any) -> Any: return self._math_op(other, lambda a, b: a - b)
-    def __mul__(self, other: Any) -> Any: return self._math_op(other, lambda a, b: a * b)
-    def __truediv__(self, other: Any) -> Any: return self._math_op(other, lambda a, b: a / b)
+    def idiv(self, other: Any) -> Vector2:
+        if other.__class__ is Vector2:
+            self.x /= other.x
+            self.y /= other.y
+        else:
+            self.x /= other
+            self.y /= other
+        return self